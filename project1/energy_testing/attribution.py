@@ -0,0 +1,300 @@
+import os
+from array import array
+
+PROC_ROOT = "/proc"
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def read_all(fd, size=8192):
+    """ Reads a file from the start until EOF with pread; /proc/stat exceeds a single read on machines with many CPUs. """
+    chunks = []
+    offset = 0
+    while True:
+        chunk = os.pread(fd, size, offset)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+        offset += len(chunk)
+
+
+def parse_stat(data):
+    """ Returns (ppid, utime + stime) from the contents of /proc/<pid>/stat. """
+    # The command name can contain spaces and parentheses, so split after the last ')'
+    fields = data[data.rindex(b")") + 2:].split()
+    return int(fields[1]), int(fields[11]) + int(fields[12])
+
+
+def parse_system_stat(data):
+    """ Returns the busy jiffies of all CPUs and the number of forks since boot from the contents of /proc/stat. """
+    busy, forks = 0, 0
+    for line in data.split(b"\n"):
+        if line.startswith(b"cpu "):
+            values = [int(v) for v in line.split()[1:]]
+            # Exclude idle and iowait; guest time is already counted in user/nice
+            busy = sum(values[:8]) - values[3] - values[4]
+        elif line.startswith(b"processes "):
+            forks = int(line.split()[1])
+    return busy, forks
+
+
+class ProcessTreeAttributor:
+    """
+    Attributes system power to a process and all its descendants using jiffy deltas
+    from /proc/<pid>/stat and /proc/stat. File descriptors are kept open between ticks.
+    New descendants are found through the `children` files of the tree's own threads, which are only read
+    when the system fork counter changed; kernels without them fall back to a rescan of all of /proc.
+    """
+
+    def __init__(self, root_pid, proc_root=PROC_ROOT):
+        self.root_pid = root_pid
+        self.proc_root = proc_root
+        self.stat_fd = os.open(os.path.join(proc_root, "stat"), os.O_RDONLY)
+        self.fds = {}
+        self.last_forks = None
+        self.last_busy = None
+        self.last_jiffies = {}
+        self.names = {}
+        busy, forks = self._read_system()
+        self.last_busy = busy
+        self.track_children = os.path.exists(os.path.join(proc_root, str(root_pid), "task", str(root_pid), "children"))
+        if self.track_children:
+            self._open(root_pid)
+            self._add_children()
+        else:
+            self._refresh_tree()
+        self.last_forks = forks
+        self.last_jiffies = self._read_tree()
+
+    def _read_system(self):
+        """ Returns the busy jiffies of all CPUs and the number of forks since boot. """
+        return parse_system_stat(read_all(self.stat_fd))
+
+    def _open(self, pid):
+        try:
+            self.fds[pid] = os.open(os.path.join(self.proc_root, str(pid), "stat"), os.O_RDONLY)
+            with open(os.path.join(self.proc_root, str(pid), "comm")) as f:
+                self.names[pid] = f.read().strip()
+        except (FileNotFoundError, ProcessLookupError):
+            self.fds.pop(pid, None)
+
+    def _close(self, pid):
+        fd = self.fds.pop(pid, None)
+        if fd is not None:
+            os.close(fd)
+        self.names.pop(pid, None)
+
+    def _read_children(self, pid):
+        """ Returns the PIDs of the children of all threads of a process (none once it has exited). """
+        children = set()
+        task_dir = os.path.join(self.proc_root, str(pid), "task")
+        try:
+            tasks = os.listdir(task_dir)
+        except (FileNotFoundError, ProcessLookupError):
+            return children
+        for task in tasks:
+            try:
+                with open(os.path.join(task_dir, task, "children"), "rb") as f:
+                    children.update(int(child) for child in f.read().split())
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+        return children
+
+    def _add_children(self):
+        """ Opens handles for the processes forked by the tree since the last tick, and for their children. """
+        stack = list(self.fds)
+        while stack:
+            for child in self._read_children(stack.pop()):
+                if child not in self.fds:
+                    self._open(child)
+                    if child in self.fds:
+                        stack.append(child)
+
+    def _refresh_tree(self):
+        """ Rescans /proc for descendants of the root process and opens handles for new ones. """
+        children = {}
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.proc_root, entry, "stat"), "rb") as f:
+                    ppid, _ = parse_stat(f.read())
+            except (FileNotFoundError, ProcessLookupError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        tree = set()
+        stack = [self.root_pid]
+        while stack:
+            pid = stack.pop()
+            if pid in tree:
+                continue
+            tree.add(pid)
+            stack.extend(children.get(pid, []))
+
+        for pid in set(self.fds) - tree:
+            self._close(pid)
+        for pid in tree - set(self.fds):
+            self._open(pid)
+
+    def _read_tree(self):
+        jiffies = {}
+        for pid, fd in list(self.fds.items()):
+            try:
+                _, jiffies[pid] = parse_stat(os.pread(fd, 1024, 0))
+            except (ProcessLookupError, ValueError):
+                # The process has exited since the last refresh
+                self._close(pid)
+        return jiffies
+
+    def pids(self):
+        """ Returns the PIDs currently attributed to the tree. """
+        return sorted(self.fds)
+
+    def name(self):
+        """ Returns the command name of the busiest known process in the tree. """
+        if not self.last_jiffies:
+            return ""
+        pid = max(self.last_jiffies, key=self.last_jiffies.get)
+        return self.names.get(pid, "")
+
+    def cpu_share(self):
+        """ Returns the tree's share of the busy CPU time since the previous call (0 to 1). """
+        busy, forks = self._read_system()
+        if forks != self.last_forks:
+            # Forks anywhere on the machine (e.g. JVM threads) change the counter; only the tree is checked
+            if self.track_children:
+                self._add_children()
+            else:
+                self._refresh_tree()
+            self.last_forks = forks
+        jiffies = self._read_tree()
+
+        # Processes that appeared since the last tick count from zero
+        tree_delta = sum(j - self.last_jiffies.get(pid, 0) for pid, j in jiffies.items())
+        busy_delta = busy - self.last_busy
+        self.last_jiffies = jiffies
+        self.last_busy = busy
+
+        if busy_delta <= 0:
+            return 0.0
+        return min(tree_delta / busy_delta, 1.0)
+
+    def close(self):
+        for pid in list(self.fds):
+            self._close(pid)
+        os.close(self.stat_fd)
+
+
+def parse_keyed(data):
+    """ Returns a dict of the `key value` lines of a cgroup file such as cpu.stat. """
+    values = {}
+    for line in data.split(b"\n"):
+        fields = line.split()
+        if len(fields) == 2:
+            values[fields[0].decode()] = int(fields[1])
+    return values
+
+
+def parse_io_stat(data):
+    """ Returns the bytes read and written by a cgroup, summed over all devices in its io.stat. """
+    read, written = 0, 0
+    for line in data.split(b"\n"):
+        for field in line.split()[1:]:
+            key, _, value = field.partition(b"=")
+            if key == b"rbytes":
+                read += int(value)
+            elif key == b"wbytes":
+                written += int(value)
+    return read, written
+
+
+def find_container_cgroup(container_id, cgroup_root=CGROUP_ROOT):
+    """
+    Returns the cgroup v2 directory of a running Docker container (systemd or cgroupfs driver),
+    or None when it does not exist (yet).
+    """
+    for path in (os.path.join(cgroup_root, "system.slice", f"docker-{container_id}.scope"),
+                 os.path.join(cgroup_root, "docker", container_id)):
+        if os.path.isfile(os.path.join(path, "cpu.stat")):
+            return path
+    return None
+
+
+class CgroupAttributor:
+    """
+    Attributes system power to a cgroup v2 (e.g. a Docker container) by its share of the CPU time of the
+    whole machine: the usage_usec of the cgroup's cpu.stat against that of the root cgroup (or the busy
+    time in /proc/stat on kernels without a root cpu.stat). Memory and I/O of the cgroup are read at
+    every tick as well. Once the cgroup is removed (the container exited), its share is 0.
+    """
+
+    def __init__(self, cgroup_path, cgroup_root=CGROUP_ROOT, proc_root=PROC_ROOT):
+        self.cgroup_path = cgroup_path
+        self.fds = {name: os.open(os.path.join(cgroup_path, name), os.O_RDONLY)
+                    for name in ("cpu.stat", "memory.current", "io.stat")
+                    if os.path.exists(os.path.join(cgroup_path, name))}
+        self.root_is_cgroup = os.path.exists(os.path.join(cgroup_root, "cpu.stat"))
+        if self.root_is_cgroup:
+            self.root_fd = os.open(os.path.join(cgroup_root, "cpu.stat"), os.O_RDONLY)
+        else:
+            self.root_fd = os.open(os.path.join(proc_root, "stat"), os.O_RDONLY)
+            self.usec_per_jiffy = 1e6 / os.sysconf("SC_CLK_TCK")
+        self.memory = array("d")
+        self.io_read = 0
+        self.io_written = 0
+        self.exited = False
+        self.last_usage = 0
+        self.last_usage = self._read_usage()
+        self.last_total = self._read_total()
+
+    def _read(self, name):
+        return read_all(self.fds[name])
+
+    def _read_usage(self):
+        try:
+            return parse_keyed(self._read("cpu.stat"))["usage_usec"]
+        except OSError:
+            # The cgroup has been removed
+            self.exited = True
+            return self.last_usage
+
+    def _read_total(self):
+        data = read_all(self.root_fd)
+        if self.root_is_cgroup:
+            return parse_keyed(data)["usage_usec"]
+        return parse_system_stat(data)[0] * self.usec_per_jiffy
+
+    def _read_resources(self):
+        try:
+            if "memory.current" in self.fds:
+                self.memory.append(int(self._read("memory.current")))
+            if "io.stat" in self.fds:
+                self.io_read, self.io_written = parse_io_stat(self._read("io.stat"))
+        except (OSError, ValueError):
+            self.exited = True
+
+    def cpu_share(self):
+        """ Returns the cgroup's share of the CPU time used since the previous call (0 to 1). """
+        usage = self.last_usage if self.exited else self._read_usage()
+        total = self._read_total()
+        if not self.exited:
+            self._read_resources()
+
+        usage_delta = usage - self.last_usage
+        total_delta = total - self.last_total
+        self.last_usage = usage
+        self.last_total = total
+
+        if total_delta <= 0:
+            return 0.0
+        return min(usage_delta / total_delta, 1.0)
+
+    def peak_memory(self):
+        """ Returns the highest memory.current seen (bytes). """
+        return max(self.memory) if self.memory else 0
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+        os.close(self.root_fd)
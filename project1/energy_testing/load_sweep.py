@@ -0,0 +1,130 @@
+import argparse
+import csv
+import os
+import signal
+import sys
+import time
+import urllib.request
+
+from attribution import ProcessTreeAttributor
+from power_metrics import INTERVAL, start_background_process
+from samplers import default_sampler_name, get_sampler
+from sampling import SamplingThread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load_simulator"))
+from http_load import HttpLoadTester  # noqa: E402
+from schedules import constant_rate  # noqa: E402
+
+FIELDS = ["Label", "Mode", "Level", "Duration (s)", "Requests", "Errors", "Throughput (req/s)",
+          "Process Energy (J)", "System Energy (J)", "Energy per Request (J)", "p50 (s)", "p99 (s)"]
+
+
+def wait_until_ready(url, timeout):
+    """ Polls the URL until the app answers, so start-up is not part of the first level. """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def kill_tree(attributor):
+    """ Terminates every process of the app's process tree, not only the shell wrapper. """
+    for pid in attributor.pids():
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def run_level(sampler, attributor, url, mode, level, duration, interval):
+    """ Runs one load level while sampling the app's power. Returns one result row. """
+    if mode == "rps":
+        tester = HttpLoadTester(url, sys.maxsize, concurrency=max(int(level), 1) * 2, duration=duration)
+        schedule = constant_rate(level, duration)
+    else:
+        tester = HttpLoadTester(url, sys.maxsize, concurrency=int(level), duration=duration)
+        schedule = None
+
+    attributor.cpu_share()  # Reset the jiffy baseline to the start of the level
+    thread = SamplingThread(sampler, attributor, interval)
+    thread.start()
+    start = time.perf_counter()
+    tester.run_simulation(schedule)
+    elapsed = time.perf_counter() - start
+    thread.stop()
+
+    summary = thread.summary()
+    completed = tester.requests - tester.errors
+    process_energy = summary["process_energy"]
+    return {
+        "Mode": mode,
+        "Level": level,
+        "Duration (s)": round(elapsed, 3),
+        "Requests": completed,
+        "Errors": tester.errors,
+        "Throughput (req/s)": round(completed / elapsed, 3),
+        "Process Energy (J)": round(process_energy, 3),
+        "System Energy (J)": round(summary["system_energy"], 3),
+        "Energy per Request (J)": round(process_energy / completed, 6) if completed else None,
+        "p50 (s)": tester.recorder.requests.percentile(50),
+        "p99 (s)": tester.recorder.requests.percentile(99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure energy per request of an app across a sweep of load levels.")
+    parser.add_argument("command", help="Command that starts the app")
+    parser.add_argument("results_file", help="CSV file the per-level results are appended to")
+    parser.add_argument("--label", required=True, help="Framework label (e.g. spring or dropwizard)")
+    parser.add_argument("--mode", choices=["concurrency", "rps"], default="concurrency",
+                        help="Step the number of concurrent clients or the open-loop request rate")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma-separated load levels")
+    parser.add_argument("--duration", type=float, default=60, help="Measurement time per level (seconds)")
+    parser.add_argument("--pause", type=float, default=10, help="Pause between levels (seconds)")
+    parser.add_argument("--url", default="http://localhost:8080/gallery", help="Gallery endpoint URL")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="Time to wait for the app (seconds)")
+    parser.add_argument("--sampler", choices=["powermetrics", "rapl", "replay"], default=default_sampler_name())
+    parser.add_argument("--trace", help="Recorded power trace for the replay sampler")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="Sampling interval (seconds)")
+    args = parser.parse_args()
+
+    levels = [float(level) for level in args.levels.split(",")]
+    sampler = get_sampler(args.sampler, args.trace)
+    pid = start_background_process(args.command)
+    if pid == -1:
+        return
+    attributor = None
+    try:
+        if not wait_until_ready(args.url, args.startup_timeout):
+            print(f"App did not answer on {args.url} within {args.startup_timeout}s")
+            return
+        attributor = ProcessTreeAttributor(pid)
+
+        write_header = not os.path.exists(args.results_file)
+        with open(args.results_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            if write_header:
+                writer.writeheader()
+            for level in levels:
+                print(f"Level {level:g} ({args.mode})")
+                row = run_level(sampler, attributor, args.url, args.mode, level, args.duration, args.interval)
+                row["Label"] = args.label
+                writer.writerow(row)
+                f.flush()
+                print(f"{row['Throughput (req/s)']} req/s, {row['Energy per Request (J)']} J/request")
+                time.sleep(args.pause)
+    finally:
+        sampler.close()
+        if attributor is not None:
+            kill_tree(attributor)
+            attributor.close()
+        else:
+            os.kill(pid, signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    main()
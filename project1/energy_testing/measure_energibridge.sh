@@ -3,6 +3,11 @@
 METHOD="energibridge"
 FRAMEWORK="$1"
 
+# Set TARGET_CI (e.g. 0.02) to stop once the CI half-width of the mean energy is below that fraction of the mean
+MAX_RUNS="${MAX_RUNS:-30}"
+MIN_RUNS="${MIN_RUNS:-10}"
+TARGET_CI="${TARGET_CI:-}"
+
 python warm_up.py
 
 mkdir -p logs
@@ -11,7 +16,7 @@ LOG_FILE="logs/power_monitoring_results_$(date +%Y%m%d_%H%M%S).log"
 SIMULATOR_LOG="${METHOD}_logs/${FRAMEWORK}_load_simulator_$(date +%Y%m%d_%H%M%S).log"
 RESULTS_FILE="${METHOD}_results/results_${FRAMEWORK}_$(date +%Y%m%d_%H%M%S).out"
 
-for i in {1..30}; do
+for i in $(seq 1 "$MAX_RUNS"); do
     echo "Iteration $i: Running powermetrics..." 
     echo "Timestamp: $(date)" | tee -a "$LOG_FILE"
     
@@ -43,6 +48,11 @@ for i in {1..30}; do
         echo "No Spring Boot process found."
     fi
 
-    echo "Pausing for 1 minute after iteration $i..." | tee -a "$LOG_FILE"
-    sleep 60
+    if [ -n "$TARGET_CI" ] && python stopping.py "${RESULTS_FILE}" --target "$TARGET_CI" --min-runs "$MIN_RUNS" --max-runs "$MAX_RUNS" >> "$LOG_FILE"; then
+        echo "Energy estimate converged after iteration $i." | tee -a "$LOG_FILE"
+        break
+    fi
+
+    echo "Cooling down for at most 1 minute after iteration $i..." | tee -a "$LOG_FILE"
+    python steady_state.py cooldown --min 10 --max 60 | tee -a "$LOG_FILE"
 done
@@ -1,23 +1,15 @@
+import argparse
 import os
 import signal
 import subprocess
 import time
-import sys
 
-# Time interval for sampling (miliseconds)
-INTERVAL = 0.1
-
-def get_system_power():
-    """ Get system-wide CPU and GPU power (in Watts) using powermetrics. """
-    cmd = ["sudo", "powermetrics", "--samplers", "cpu_power", "-i", "1", "-n", "1"]
-    output = subprocess.check_output(cmd, text=True)
-
-    cpu_power = 0.0
-    for line in output.split("\n"):
-        if "CPU Power" in line:
-            cpu_power = float(line.split(":")[1].strip().split()[0]) / 1000  # Convert mW to W
+from attribution import ProcessTreeAttributor
+from samplers import default_sampler_name, get_sampler
+from sampling import SamplingThread
 
-    return cpu_power
+# Time interval for sampling (seconds)
+INTERVAL = 0.1
 
 def start_background_process(command):
     try:
@@ -34,68 +26,59 @@ def kill_process(pid):
     print(f"Killing pid {pid}")
     os.kill(pid, signal.SIGTERM)
 
-def estimate_energy(cpu_power, process_pid, duration):
-    """ Get per-process CPU usage (%) using ps. """
-    cmd = ["ps", "-eo", "pid,%cpu,comm"]
-
-    output = subprocess.check_output(cmd, text=True)
-    total_cpu_usage = 0
-    process_cpu = 0
-    process_name = ""
-
-    for line in output.strip().split("\n")[1:]:
-        parts = line.split(None, 2)
-        if len(parts) == 3:
-            pid, cpu, name = parts
-            total_cpu_usage += float(cpu)
-            if int(pid) == process_pid:
-                process_cpu = float(cpu)
-                process_name = name
-
-    """ Estimate energy usage for each process (in Joules). """
-    if total_cpu_usage == 0:
-        return process_name, process_cpu
-
-    process_power = (process_cpu / total_cpu_usage) * cpu_power if total_cpu_usage > 0 else 0
-    energy = process_power * duration  # Energy (J) = Power (W) × Time (s)
-
-    return process_name, energy
-
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python script.py '<command>' <time_in_s> <results_file>")
-        sys.exit(1)
-    
-    bash_command = sys.argv[1]
-    runtime = int(sys.argv[2])
-    results_file = sys.argv[3]
+    parser = argparse.ArgumentParser(description="Estimate the energy consumption of a command.")
+    parser.add_argument("command", help="Command to run in the background")
+    parser.add_argument("runtime", type=int, help="Measurement time (seconds)")
+    parser.add_argument("results_file", help="File the total energy is appended to")
+    parser.add_argument("--sampler", choices=["powermetrics", "rapl", "replay"], default=default_sampler_name(),
+                        help="System power source (default: rapl when available, powermetrics otherwise)")
+    parser.add_argument("--trace", help="Recorded power trace for the replay sampler")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="Sampling interval (seconds)")
+    parser.add_argument("--series", help="CSV file to save the sampled power time series to")
+    args = parser.parse_args()
+
+    bash_command = args.command
+    runtime = args.runtime
+    results_file = args.results_file
+    sampler = get_sampler(args.sampler, args.trace)
 
     print("Estimating per-process energy consumption... (Press Ctrl+C to stop)")
-    total_energy = 0
-    time_elapsed = 0
     pid = -1
+    process = ""
+    attributor = None
+    thread = None
     try:
         pid = start_background_process(bash_command)
-        start_time = time.time()
-        while time.time() - start_time < runtime:
-            time_elapsed += INTERVAL
-            cpu_power = get_system_power()
-            process, energy = estimate_energy(cpu_power, pid, INTERVAL)
-            total_energy += energy
-
-            # print(f"Total energy consumed so far by {process}: {energy}J in last {INTERVAL}s")
-            time.sleep(INTERVAL)
+        attributor = ProcessTreeAttributor(pid)
+        thread = SamplingThread(sampler, attributor, args.interval)
+        thread.start()
+        time.sleep(runtime)
 
     except KeyboardInterrupt:
         print("\nStopping...")
     
     finally:
+        if thread is not None:
+            thread.stop()
+        sampler.close()
+        if attributor is not None:
+            process = attributor.name()
+            attributor.close()
         if pid != -1:
             kill_process(pid)
-            print(f"Total energy used by {process}: {round(total_energy, 3)}J")
-            f = open(results_file, "a")
-            f.write(f"{round(total_energy, 3)}\n")
-            f.close()
+        if thread is not None:
+            summary = thread.summary()
+            total_energy = summary["process_energy"]
+            print(f"Sampled {summary['samples']} times in {summary['duration']:.2f}s "
+                  f"({summary['achieved_rate']:.1f}/s of {summary['target_rate']:.1f}/s target, "
+                  f"{summary['missed_deadlines']} missed deadlines)")
+            print(f"Total energy used by {process}: {round(total_energy, 3)}J "
+                  f"(system: {round(summary['system_energy'], 3)}J)")
+            with open(results_file, "a") as f:
+                f.write(f"{round(total_energy, 3)}\n")
+            if args.series:
+                thread.series.save(args.series)
 
 if __name__ == "__main__":
     main()
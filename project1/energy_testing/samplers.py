@@ -0,0 +1,164 @@
+import glob
+import os
+import subprocess
+import time
+
+RAPL_ROOT = "/sys/class/powercap"
+
+
+class PowerSampler:
+    """ Base class for system power sources. read() returns the system power (in Watts). """
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PowermetricsSampler(PowerSampler):
+    """ macOS backend: spawns `sudo powermetrics` once per sample. """
+
+    def read(self):
+        cmd = ["sudo", "powermetrics", "--samplers", "cpu_power", "-i", "1", "-n", "1"]
+        output = subprocess.check_output(cmd, text=True)
+
+        cpu_power = 0.0
+        for line in output.split("\n"):
+            if "CPU Power" in line:
+                cpu_power = float(line.split(":")[1].strip().split()[0]) / 1000  # Convert mW to W
+
+        return cpu_power
+
+
+def rapl_domain_name(path):
+    """ Name of a RAPL domain (e.g. package-0, dram or psys). """
+    with open(os.path.join(path, "name")) as f:
+        return f.read().strip()
+
+
+class RaplDomain:
+    """ One RAPL energy counter with its file descriptor kept open between reads. """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = rapl_domain_name(path)
+        with open(os.path.join(path, "max_energy_range_uj")) as f:
+            self.max_range = int(f.read())
+        self.fd = os.open(os.path.join(path, "energy_uj"), os.O_RDONLY)
+        try:
+            self.last = self._read_raw()
+        except (OSError, ValueError):
+            os.close(self.fd)
+            raise
+        self.total_uj = 0
+
+    def _read_raw(self):
+        return int(os.pread(self.fd, 32, 0))
+
+    def update(self):
+        """ Reads the counter and returns the energy (uJ) since the previous read, handling wraparound. """
+        value = self._read_raw()
+        delta = value - self.last
+        if delta < 0:
+            delta += self.max_range
+        self.last = value
+        self.total_uj += delta
+        return delta
+
+    def close(self):
+        os.close(self.fd)
+
+
+class RaplSampler(PowerSampler):
+    """
+    Linux backend reading the /sys/class/powercap/intel-rapl energy counters.
+    Only top-level package domains are summed (sub-domains such as core/dram are part of the package).
+    The top-level psys domain of client CPUs covers the whole SoC including the packages, so it is left out.
+    """
+
+    def __init__(self, root=RAPL_ROOT):
+        paths = sorted(p for p in glob.glob(os.path.join(root, "intel-rapl:*"))
+                       if p.count(":") == 1 and rapl_domain_name(p) != "psys")
+        if not paths:
+            raise FileNotFoundError(f"No RAPL domains found under {root}")
+        self.domains = []
+        try:
+            for p in paths:
+                self.domains.append(RaplDomain(p))
+        except OSError:
+            # e.g. PermissionError for non-root users: close the domains opened so far
+            self.close()
+            raise
+        self.last_time = time.monotonic()
+
+    def read_energy(self):
+        """ Returns the energy (J) used since the previous read. """
+        return sum(domain.update() for domain in self.domains) / 1e6
+
+    def total_energy(self):
+        """ Returns the energy (J) accumulated since the sampler was opened. """
+        return sum(domain.total_uj for domain in self.domains) / 1e6
+
+    def read(self):
+        now = time.monotonic()
+        energy = self.read_energy()
+        elapsed = now - self.last_time
+        self.last_time = now
+        return energy / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        for domain in self.domains:
+            domain.close()
+
+
+class ReplaySampler(PowerSampler):
+    """
+    Feeds a recorded power trace, so the harness can run on machines without RAPL.
+    The trace holds one power value (W) per line, optionally as `timestamp,watts`.
+    """
+
+    def __init__(self, trace_file, loop=True):
+        self.values = []
+        with open(trace_file) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    self.values.append(float(line.split(",")[-1]))
+                except ValueError:
+                    continue  # Header line
+        if not self.values:
+            raise ValueError(f"No samples found in {trace_file}")
+        self.loop = loop
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.values):
+            if not self.loop:
+                return self.values[-1]
+            self.index = 0
+        value = self.values[self.index]
+        self.index += 1
+        return value
+
+
+def get_sampler(name, trace_file=None):
+    """ Returns the sampler backend for the given name ("powermetrics", "rapl" or "replay"). """
+    if name == "powermetrics":
+        return PowermetricsSampler()
+    if name == "rapl":
+        return RaplSampler()
+    if name == "replay":
+        if trace_file is None:
+            raise ValueError("The replay sampler needs a trace file")
+        return ReplaySampler(trace_file)
+    raise ValueError(f"Unknown sampler: {name}")
+
+
+def default_sampler_name():
+    """ Picks RAPL when the counters are available, powermetrics otherwise. """
+    if glob.glob(os.path.join(RAPL_ROOT, "intel-rapl:*")):
+        return "rapl"
+    return "powermetrics"
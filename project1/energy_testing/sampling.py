@@ -0,0 +1,104 @@
+import csv
+import threading
+import time
+from array import array
+
+
+def trapezoid(times, values):
+    """ Integrates values over (non-uniform) timestamps using the trapezoid rule. """
+    total = 0.0
+    for i in range(1, len(times)):
+        total += (values[i] + values[i - 1]) * (times[i] - times[i - 1]) / 2
+    return total
+
+
+class PowerSeries:
+    """ Compact in-memory time series of timestamped power samples (in Watts). """
+
+    def __init__(self):
+        self.times = array("d")
+        self.system_power = array("d")
+        self.process_power = array("d")
+
+    def append(self, timestamp, system_power, process_power):
+        self.times.append(timestamp)
+        self.system_power.append(system_power)
+        self.process_power.append(process_power)
+
+    def __len__(self):
+        return len(self.times)
+
+    def system_energy(self):
+        return trapezoid(self.times, self.system_power)
+
+    def process_energy(self):
+        return trapezoid(self.times, self.process_power)
+
+    def duration(self):
+        return self.times[-1] - self.times[0] if len(self.times) > 1 else 0.0
+
+    def save(self, path):
+        """ Writes the series to a CSV file with one row per sample. """
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Time (s)", "System Power (W)", "Process Power (W)"])
+            for row in zip(self.times, self.system_power, self.process_power):
+                writer.writerow([f"{row[0]:.6f}", f"{row[1]:.4f}", f"{row[2]:.4f}"])
+
+
+class SamplingThread(threading.Thread):
+    """
+    Samples power on a dedicated thread following a fixed deadline schedule on the monotonic clock.
+    Deadlines are computed from the start time, so slow samples do not make the schedule drift;
+    deadlines that already passed are skipped and counted as missed.
+    """
+
+    def __init__(self, sampler, attributor=None, interval=0.1):
+        super().__init__(daemon=True)
+        self.sampler = sampler
+        self.attributor = attributor
+        self.interval = interval
+        self.series = PowerSeries()
+        self.missed_deadlines = 0
+        self.start_time = None
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        system_power = self.sampler.read()
+        share = self.attributor.cpu_share() if self.attributor is not None else 1.0
+        self.series.append(time.monotonic() - self.start_time, system_power, share * system_power)
+
+    def run(self):
+        self.start_time = time.monotonic()
+        tick = 0
+        while not self._stop_event.is_set():
+            self.sample()
+            tick += 1
+            deadline = self.start_time + tick * self.interval
+            now = time.monotonic()
+            if now > deadline:
+                late_ticks = int((now - deadline) / self.interval) + 1
+                self.missed_deadlines += late_ticks
+                tick += late_ticks
+                deadline = self.start_time + tick * self.interval
+            self._stop_event.wait(deadline - now)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def achieved_rate(self):
+        """ Returns the number of samples per second that were actually taken. """
+        duration = self.series.duration()
+        return (len(self.series) - 1) / duration if duration > 0 else 0.0
+
+    def summary(self):
+        return {
+            "samples": len(self.series),
+            "duration": self.series.duration(),
+            "target_rate": 1 / self.interval,
+            "achieved_rate": self.achieved_rate(),
+            "missed_deadlines": self.missed_deadlines,
+            "system_energy": self.series.system_energy(),
+            "process_energy": self.series.process_energy(),
+        }
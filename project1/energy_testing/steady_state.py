@@ -0,0 +1,152 @@
+import argparse
+import glob
+import threading
+import time
+from collections import deque
+
+from samplers import RaplSampler
+
+CPUFREQ_GLOB = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"
+THERMAL_GLOB = "/sys/class/thermal/thermal_zone*/temp"
+
+
+def read_cpu_frequency():
+    """ Mean current frequency of all CPUs (kHz), or None when cpufreq is not available. """
+    values = []
+    for path in glob.glob(CPUFREQ_GLOB):
+        try:
+            with open(path) as f:
+                values.append(int(f.read()))
+        except (OSError, ValueError):
+            continue
+    return sum(values) / len(values) if values else None
+
+
+def read_temperature():
+    """ Highest thermal zone temperature (°C), or None when no thermal zones are available. """
+    values = []
+    for path in glob.glob(THERMAL_GLOB):
+        try:
+            with open(path) as f:
+                values.append(int(f.read()) / 1000)
+        except (OSError, ValueError):
+            continue
+    return max(values) if values else None
+
+
+class SteadyStateDetector:
+    """
+    Samples package power, CPU frequency and temperature in the background and detects when the
+    system is stable: every available metric stays within a relative tolerance over a rolling window.
+    Warm-up and cool-down phases end as soon as the system is stable (but not before min_time),
+    or at max_time. Without any readable metric the phases simply last max_time.
+    """
+
+    def __init__(self, window=10, interval=1.0, tolerance=0.05, sampler=None):
+        self.window = window
+        self.interval = interval
+        self.tolerance = tolerance
+        if sampler is None:
+            try:
+                sampler = RaplSampler()
+            except (FileNotFoundError, PermissionError):
+                sampler = None
+        self.sampler = sampler
+        self.readers = {"frequency": read_cpu_frequency, "temperature": read_temperature}
+        if self.sampler is not None:
+            self.readers["power"] = self.sampler.read
+        self.history = {name: deque(maxlen=window) for name in self.readers}
+        self.phases = []
+
+    def _sample(self):
+        for name, reader in self.readers.items():
+            value = reader()
+            if value is not None:
+                self.history[name].append(value)
+
+    def is_stable(self):
+        """ True when every metric has a full window whose spread is within the tolerance of its mean. """
+        windows = [values for values in self.history.values() if values]
+        if not windows:
+            return False
+        for values in windows:
+            if len(values) < self.window:
+                return False
+            mean = sum(values) / len(values)
+            if mean == 0 or (max(values) - min(values)) / abs(mean) > self.tolerance:
+                return False
+        return True
+
+    def _sampling_loop(self, stop, stable):
+        deadline = time.monotonic()
+        while not stop.is_set():
+            self._sample()
+            # Cleared again when the window drifts, so a phase only ends on a currently stable window
+            if self.is_stable():
+                stable.set()
+            else:
+                stable.clear()
+            deadline += self.interval
+            stop.wait(max(deadline - time.monotonic(), 0))
+
+    def run_phase(self, name, min_time=0, max_time=60, work=None):
+        """
+        Runs a warm-up or cool-down phase. With `work`, the callable is run repeatedly during the phase
+        (warm-up load); otherwise the phase only waits. Returns the duration of the phase (seconds).
+        """
+        for values in self.history.values():
+            values.clear()
+        stop, stable = threading.Event(), threading.Event()
+        thread = threading.Thread(target=self._sampling_loop, args=(stop, stable), daemon=True)
+        start = time.monotonic()
+        thread.start()
+        try:
+            while True:
+                elapsed = time.monotonic() - start
+                if elapsed >= max_time or (elapsed >= min_time and stable.is_set()):
+                    break
+                if work is not None:
+                    work()
+                elif elapsed < min_time:
+                    time.sleep(min(self.interval, min_time - elapsed))
+                else:
+                    stable.wait(min(self.interval, max_time - elapsed))
+        finally:
+            stop.set()
+            thread.join()
+
+        duration = time.monotonic() - start
+        reason = "stable" if stable.is_set() and duration < max_time else "max time reached"
+        self.phases.append((name, duration, reason))
+        print(f"{name} took {duration:.1f}s ({reason})")
+        return duration
+
+    def warm_up(self, work, min_time=0, max_time=60):
+        return self.run_phase("Warm-up", min_time, max_time, work)
+
+    def cool_down(self, min_time=0, max_time=60):
+        return self.run_phase("Cool-down", min_time, max_time)
+
+    def close(self):
+        if self.sampler is not None:
+            self.sampler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wait until the system is in a steady state.")
+    parser.add_argument("phase", choices=["warmup", "cooldown"], help="Phase to run")
+    parser.add_argument("--min", type=float, default=0, help="Minimum duration (seconds)")
+    parser.add_argument("--max", type=float, default=60, help="Maximum duration (seconds)")
+    parser.add_argument("--window", type=int, default=10, help="Number of samples that must be stable")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Allowed relative spread within the window")
+    args = parser.parse_args()
+
+    detector = SteadyStateDetector(args.window, tolerance=args.tolerance)
+    if args.phase == "warmup":
+        detector.warm_up(lambda: [x**2 for x in range(10000)], args.min, args.max)
+    else:
+        detector.cool_down(args.min, args.max)
+    detector.close()
+
+if __name__ == "__main__":
+    main()
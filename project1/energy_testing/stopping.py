@@ -0,0 +1,85 @@
+import argparse
+import math
+import sys
+from statistics import NormalDist
+
+
+def t_quantile(p, df):
+    """ Quantile of Student's t distribution (Cornish-Fisher expansion, within 0.5% for df >= 3). """
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z**3 + z) / (4 * df)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * df**4))
+
+
+class SequentialStopper:
+    """
+    Sequential stopping rule for a measurement campaign. The running mean and variance are updated
+    after each run (Welford), and the campaign stops once at least min_runs are done and the
+    confidence interval half-width of the mean is below target (relative to the mean),
+    or when max_runs is reached.
+    """
+
+    def __init__(self, target=0.02, min_runs=10, max_runs=30, confidence=0.95):
+        self.target = target
+        self.min_runs = max(min_runs, 4)  # The t quantile approximation needs df >= 3
+        self.max_runs = max_runs
+        self.confidence = confidence
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+    def half_width(self):
+        """ Half-width of the confidence interval of the mean, or inf with fewer than two runs. """
+        if self.n < 2:
+            return math.inf
+        sd = math.sqrt(self._m2 / (self.n - 1))
+        return t_quantile((1 + self.confidence) / 2, self.n - 1) * sd / math.sqrt(self.n)
+
+    def relative_half_width(self):
+        return self.half_width() / abs(self.mean) if self.mean != 0 else math.inf
+
+    def converged(self):
+        return self.n >= self.min_runs and self.relative_half_width() <= self.target
+
+    def should_stop(self):
+        return self.converged() or self.n >= self.max_runs
+
+    def status(self):
+        return (f"{self.n} runs, mean {self.mean:.3f} ± {self.half_width():.3f} "
+                f"({self.relative_half_width():.1%} of the mean, target {self.target:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check whether the values in a results file (one per line) have converged. "
+                    "Exits with 0 when the estimate has converged, 1 when more runs are needed.")
+    parser.add_argument("results_file", help="File with one measured value per line")
+    parser.add_argument("--target", type=float, default=0.02, help="Target relative CI half-width")
+    parser.add_argument("--min-runs", type=int, default=10, help="Minimum number of runs")
+    parser.add_argument("--max-runs", type=int, default=30, help="Maximum number of runs")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level")
+    args = parser.parse_args()
+
+    stopper = SequentialStopper(args.target, args.min_runs, args.max_runs, args.confidence)
+    try:
+        with open(args.results_file) as f:
+            for line in f:
+                if line.strip():
+                    stopper.update(float(line))
+    except FileNotFoundError:
+        pass
+
+    print(stopper.status())
+    sys.exit(0 if stopper.converged() else 1)
+
+if __name__ == "__main__":
+    main()
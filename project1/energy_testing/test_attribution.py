@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from attribution import CgroupAttributor, find_container_cgroup
+
+CONTAINER_ID = "0123456789abcdef"
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def cgroup_tree(tmp_path):
+    """ Fake cgroup v2 hierarchy with a root cpu.stat and one Docker container scope. """
+    container = tmp_path / "system.slice" / f"docker-{CONTAINER_ID}.scope"
+    container.mkdir(parents=True)
+    write(tmp_path / "cpu.stat", "usage_usec 1000000\nuser_usec 800000\nsystem_usec 200000\n")
+    write(container / "cpu.stat", "usage_usec 100000\nuser_usec 90000\nsystem_usec 10000\n")
+    write(container / "memory.current", "1048576\n")
+    write(container / "io.stat", "8:0 rbytes=4096 wbytes=8192 rios=1 wios=2\n")
+    return tmp_path, container
+
+
+def test_find_container_cgroup(cgroup_tree):
+    root, container = cgroup_tree
+    assert find_container_cgroup(CONTAINER_ID, str(root)) == str(container)
+    assert find_container_cgroup("fedcba9876543210", str(root)) is None
+
+
+def test_cpu_share_memory_and_io(cgroup_tree):
+    root, container = cgroup_tree
+    attributor = CgroupAttributor(str(container), str(root))
+    assert attributor.root_is_cgroup
+
+    write(root / "cpu.stat", "usage_usec 2000000\n")
+    write(container / "cpu.stat", "usage_usec 350000\n")
+    write(container / "memory.current", "4194304\n")
+    write(container / "io.stat", "8:0 rbytes=4096 wbytes=8192\n8:16 rbytes=1000 wbytes=0\n")
+    assert attributor.cpu_share() == pytest.approx(0.25)
+    assert attributor.peak_memory() == 4194304
+    assert (attributor.io_read, attributor.io_written) == (5096, 8192)
+
+    # No CPU time used since the previous tick
+    assert attributor.cpu_share() == 0.0
+    attributor.close()
+
+
+def test_removed_cgroup_counts_as_exited(cgroup_tree):
+    root, container = cgroup_tree
+    attributor = CgroupAttributor(str(container), str(root))
+    os.close(attributor.fds.pop("cpu.stat"))
+    attributor.fds["cpu.stat"] = os.open(str(root), os.O_RDONLY)  # Reads fail like those of a removed cgroup
+
+    write(root / "cpu.stat", "usage_usec 3000000\n")
+    assert attributor.cpu_share() == 0.0
+    assert attributor.exited
+    attributor.close()
+
+
+def test_cgroup_removed_before_the_first_read(cgroup_tree, monkeypatch):
+    root, container = cgroup_tree
+
+    def removed(self, name):
+        raise OSError("No such device")
+
+    monkeypatch.setattr(CgroupAttributor, "_read", removed)
+    attributor = CgroupAttributor(str(container), str(root))
+    assert attributor.exited
+    assert attributor.last_usage == 0
+    assert attributor.cpu_share() == 0.0
+    attributor.close()
+
+
+def test_proc_stat_fallback_without_root_cpu_stat(cgroup_tree, tmp_path_factory):
+    root, container = cgroup_tree
+    os.remove(root / "cpu.stat")
+    proc = tmp_path_factory.mktemp("proc")
+    write(proc / "stat", "cpu  100 0 100 1000 0 0 0 0 0 0\nprocesses 10\n")
+    attributor = CgroupAttributor(str(container), str(root), str(proc))
+    assert not attributor.root_is_cgroup
+
+    # 100 busy jiffies more, of which the container used 50 (in usec)
+    write(proc / "stat", "cpu  200 0 100 1000 0 0 0 0 0 0\nprocesses 10\n")
+    write(container / "cpu.stat", f"usage_usec {100000 + 50 * attributor.usec_per_jiffy:.0f}\n")
+    assert attributor.cpu_share() == pytest.approx(0.5)
+    attributor.close()
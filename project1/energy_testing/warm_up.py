@@ -1,14 +1,20 @@
-import time
+import sys
 
-def warm_up(duration=60):
-    end_time = time.time() + duration
-    while time.time() < end_time:
-        _ = [x**2 for x in range(10000)]
+from steady_state import SteadyStateDetector
+
+def work():
+    _ = [x**2 for x in range(10000)]
+
+def warm_up(duration=60, min_duration=10):
+    """Runs the warm-up load until the system is stable, for at most `duration` seconds."""
+    detector = SteadyStateDetector()
+    detector.warm_up(work, min_duration, duration)
+    detector.close()
 
 def main():
     print("Warming up...")
-    warm_up()
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    warm_up(duration)
 
 if __name__ == "__main__":
     main()
-
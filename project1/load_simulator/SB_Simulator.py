@@ -1,15 +1,38 @@
+import csv
+import queue
 import time
 import subprocess
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from histogram import LatencyRecorder
+from http_load import HttpLoadTester
+from schedules import parse_schedule
+
+# Navigation Timing entries of the current page, with times relative to the request start
+TIMING_SCRIPT = """
+return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+    .map(e => ({name: e.name, type: e.entryType, ttfb: e.responseStart - e.startTime,
+                transfer_size: e.transferSize, load_time: e.responseEnd - e.startTime}));
+"""
+
+IMAGES_COMPLETE_SCRIPT = "return Array.from(document.images).every(img => img.complete);"
 
 class LoadTester:
-    def __init__(self, url, iterations):
+    def __init__(self, url, iterations, workers=1, timeout=30):
         self.url = url
         self.iterations = iterations
-        self.driver = self._initialize_driver()
+        self.workers = workers
+        self.timeout = timeout
+        self.timings = []
+        self.recorder = LatencyRecorder()
+        self.drivers = queue.Queue()
+        for _ in range(workers):
+            self.drivers.put((self._initialize_driver(), LatencyRecorder()))
 
     def _initialize_driver(self):
         """Initialize the Selenium WebDriver with headless Chrome options."""
@@ -19,32 +42,81 @@ class LoadTester:
         chrome_options.add_argument("--disable-application-cache")
         return webdriver.Chrome(options=chrome_options)
 
+    def _run_iteration(self, i):
+        """Loads the gallery on a pooled driver and records the timing of the page and every image."""
+        driver, recorder = self.drivers.get()
+        try:
+            print(f"Iteration {i + 1}/{self.iterations}")
+            start = time.perf_counter()
+            driver.get(self.url)
+
+            # Wait for the page to fully load
+            wait = WebDriverWait(driver, self.timeout)
+            wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+            # Scroll all the way to the bottom of the page
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+            # Wait until every image has finished loading
+            wait.until(lambda d: d.execute_script(IMAGES_COMPLETE_SCRIPT))
+
+            recorder.record_iteration(time.perf_counter() - start)
+
+            entries = driver.execute_script(TIMING_SCRIPT)
+            for entry in entries:
+                entry["iteration"] = i
+                recorder.record_request(entry["load_time"] / 1000)
+            self.timings.extend(entries)
+        finally:
+            self.drivers.put((driver, recorder))
+
     def run_simulation(self):
-        """Simulates user interactions with the gallery page."""
+        """Simulates user interactions with the gallery page on a pool of browsers."""
         try:
-            for i in range(self.iterations):
-                print(f"Iteration {i + 1}/{self.iterations}")
-                self.driver.get(self.url)
-
-                # Wait for the page to fully load
-                time.sleep(1)
-
-                # Scroll all the way to the bottom of the page
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                
-                # Wait a moment after scrolling
-                time.sleep(1)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for future in [executor.submit(self._run_iteration, i) for i in range(self.iterations)]:
+                    future.result()
         finally:
             self.cleanup()
+        self.recorder.print_summary()
+
+    def save_timings(self, path):
+        """Writes the recorded TTFB, transfer size and load time (ms) of every resource to a CSV file."""
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["iteration", "type", "name", "ttfb", "transfer_size", "load_time"])
+            writer.writeheader()
+            writer.writerows(self.timings)
 
     def cleanup(self):
-        """Closes the WebDriver instance."""
-        self.driver.quit()
+        """Closes all WebDriver instances and merges the latency recorders of their workers."""
+        while not self.drivers.empty():
+            driver, recorder = self.drivers.get()
+            driver.quit()
+            self.recorder.merge(recorder)
 
 def main():
     parser = argparse.ArgumentParser(description="Run a Selenium load test after building an application.")
     # parser.add_argument("build_script", help="Path to the build script (e.g., sb-app)")
     parser.add_argument("iterations", type=int, help="Number of times to perform the simulation")
+    parser.add_argument("--engine", choices=["selenium", "http"], default="selenium",
+                        help="Load engine: a headless browser, or asyncio HTTP requests without a browser")
+    parser.add_argument("-c", "--concurrency", type=int, default=10,
+                        help="Number of concurrent gallery loads and pooled connections (http engine, closed loop; "
+                             "open loop does not limit connections)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of headless browsers running iterations in parallel (selenium engine)")
+    parser.add_argument("--timings", help="CSV file to save per-resource Navigation Timing data to (selenium engine)")
+    parser.add_argument("--latency", help="JSON file to save the latency histograms and throughput to")
+    parser.add_argument("--label", help="Label stored with the latency data (e.g. sb-app or dropwizard-app)")
+    parser.add_argument("--schedule",
+                        help="Open-loop arrival schedule (http engine): constant:<rps>, poisson:<rps>, "
+                             "ramp:<start_rps>:<end_rps>, steps:<rps>@<sec>,... or trace:<file>. "
+                             "Iterations then caps the number of gallery loads")
+    parser.add_argument("--duration", type=float, default=60, help="Duration of the open-loop schedule (seconds)")
+    parser.add_argument("--seed", type=int, help="Random seed for Poisson arrivals")
+    parser.add_argument("--url", default="http://localhost:8080/gallery", help="Gallery endpoint URL")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="Seconds after which a request counts as an error (http engine)")
     
     args = parser.parse_args()
 
@@ -53,11 +125,20 @@ def main():
     # subprocess.run([f'../{args.build_script}/build.sh'], shell=True, check=True)
 
     # Define test parameters
-    target_url = "http://localhost:8080/gallery"
+    target_url = args.url
 
     # Start load testing
-    tester = LoadTester(target_url, args.iterations)
-    tester.run_simulation()
+    if args.engine == "http":
+        tester = HttpLoadTester(target_url, args.iterations, args.concurrency, timeout=args.timeout)
+        schedule = parse_schedule(args.schedule, args.duration, args.seed) if args.schedule else None
+        tester.run_simulation(schedule)
+    else:
+        tester = LoadTester(target_url, args.iterations, args.workers)
+        tester.run_simulation()
+    if args.timings and args.engine == "selenium":
+        tester.save_timings(args.timings)
+    if args.latency:
+        tester.recorder.save(args.latency, args.label)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,209 @@
+import json
+import time
+from array import array
+
+# Values are recorded in microseconds with 7 significant bits per power of two (< 1% error)
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# Highest trackable value: about 1.2 hours
+MAX_VALUE_BITS = 32
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def bucket_index(value):
+    """Returns the log-linear bucket of a value in microseconds."""
+    if value < 2 * SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def bucket_upper_value(index):
+    """Returns the highest value in microseconds that falls into a bucket."""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    return ((index - shift * SUB_BUCKET_COUNT) << shift) + (1 << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies with fixed memory: recording a sample increments a counter
+    in a preallocated array of log-linear buckets instead of growing a list.
+    """
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0
+        self.min = MAX_VALUE
+        self.max = 0
+
+    def record(self, seconds):
+        value = min(max(int(seconds * 1e6), 0), MAX_VALUE)
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Adds the samples of another histogram to this one."""
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Returns the latency (seconds) at or below which p percent of the samples fall."""
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(round(p / 100 * self.count)))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(bucket_upper_value(i), self.max) / 1e6
+        return self.max / 1e6
+
+    def mean(self):
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+    def summary(self):
+        summary = {"count": self.count, "mean": self.mean()}
+        for p in PERCENTILES:
+            summary[f"p{p:g}"] = self.percentile(p)
+        summary["max"] = self.max / 1e6
+        return summary
+
+    def to_dict(self):
+        """Compact representation holding only the non-empty buckets."""
+        return {
+            "count": self.count,
+            "total_us": self.total,
+            "min_us": self.min,
+            "max_us": self.max,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for i, c in data["buckets"].items():
+            histogram.counts[int(i)] = c
+        histogram.count = data["count"]
+        histogram.total = data["total_us"]
+        histogram.min = data["min_us"]
+        histogram.max = data["max_us"]
+        return histogram
+
+
+class LatencyRecorder:
+    """
+    Records the latency of every request and iteration, and the number of completed requests
+    per time window. Recorders of different workers can be merged and exported to a file.
+    In open loop, the client-side queueing delay (intended send time until the request is sent) and the
+    service latency of the page request (sent until answered) are recorded separately as well.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self.start_time = time.time()
+        self.requests = LatencyHistogram()
+        self.iterations = LatencyHistogram()
+        self.queueing = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.windows = {}
+
+    def record_request(self, latency, timestamp=None):
+        """Records a completed request; timestamp is the wall-clock completion time."""
+        self.requests.record(latency)
+        if timestamp is None:
+            timestamp = time.time()
+        window = int((timestamp - self.start_time) / self.window)
+        self.windows[window] = self.windows.get(window, 0) + 1
+
+    def record_iteration(self, latency):
+        self.iterations.record(latency)
+
+    def record_queueing(self, delay):
+        self.queueing.record(delay)
+
+    def record_service(self, latency):
+        self.service.record(latency)
+
+    def merge(self, other):
+        self.requests.merge(other.requests)
+        self.iterations.merge(other.iterations)
+        self.queueing.merge(other.queueing)
+        self.service.merge(other.service)
+        # Re-align the windows of both recorders on the earliest start time
+        start_time = min(self.start_time, other.start_time)
+        windows = {}
+        for recorder in (self, other):
+            offset = recorder.start_time - start_time
+            for window, count in recorder.windows.items():
+                key = int((window * recorder.window + offset) / self.window)
+                windows[key] = windows.get(key, 0) + count
+        self.windows = windows
+        self.start_time = start_time
+
+    def throughput(self):
+        """Returns (window start time in seconds, requests/sec) for every window."""
+        if not self.windows:
+            return []
+        return [(w * self.window, self.windows.get(w, 0) / self.window)
+                for w in range(min(self.windows), max(self.windows) + 1)]
+
+    def print_summary(self):
+        for name, histogram in [("Requests", self.requests), ("Iterations", self.iterations),
+                                ("Client queueing", self.queueing), ("Page service", self.service)]:
+            if histogram.count == 0:
+                continue
+            summary = histogram.summary()
+            percentiles = ", ".join(f"p{p:g}: {summary[f'p{p:g}'] * 1000:.1f}ms" for p in PERCENTILES)
+            print(f"{name}: {summary['count']} | {percentiles}, max: {summary['max'] * 1000:.1f}ms")
+        rates = [rate for _, rate in self.throughput()]
+        if rates:
+            print(f"Throughput: mean {sum(rates) / len(rates):.1f} req/s, peak {max(rates):.1f} req/s "
+                  f"over {len(rates)} windows of {self.window:g}s")
+
+    def save(self, path, label=None):
+        """Writes the histograms and throughput windows as JSON; start_time joins it with energy results."""
+        data = {
+            "label": label,
+            "start_time": self.start_time,
+            "window": self.window,
+            "requests": self.requests.to_dict(),
+            "iterations": self.iterations.to_dict(),
+            "queueing": self.queueing.to_dict(),
+            "service": self.service.to_dict(),
+            "requests_summary": self.requests.summary(),
+            "iterations_summary": self.iterations.summary(),
+            "queueing_summary": self.queueing.summary(),
+            "service_summary": self.service.summary(),
+            "windows": {str(w): c for w, c in sorted(self.windows.items())},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        recorder = cls(data["window"])
+        recorder.start_time = data["start_time"]
+        recorder.requests = LatencyHistogram.from_dict(data["requests"])
+        recorder.iterations = LatencyHistogram.from_dict(data["iterations"])
+        # Files written before queueing and service latency were recorded lack them
+        if "queueing" in data:
+            recorder.queueing = LatencyHistogram.from_dict(data["queueing"])
+            recorder.service = LatencyHistogram.from_dict(data["service"])
+        recorder.windows = {int(w): c for w, c in data["windows"].items()}
+        return recorder
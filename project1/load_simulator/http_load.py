@@ -0,0 +1,159 @@
+import asyncio
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import aiohttp
+
+from histogram import LatencyRecorder
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageSourceParser(HTMLParser):
+    """Collects the image URLs of the rendered gallery page (`th:src` is rendered as `src`)."""
+
+    def __init__(self):
+        super().__init__()
+        self.sources = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "img":
+            return
+        attrs = dict(attrs)
+        source = attrs.get("src") or attrs.get("th:src")
+        if source:
+            self.sources.append(source)
+
+
+def parse_image_urls(html, base_url):
+    """Returns the absolute URLs of all images referenced by the gallery page."""
+    parser = ImageSourceParser()
+    parser.feed(html)
+    return [urljoin(base_url, source) for source in parser.sources]
+
+
+class HttpLoadTester:
+    """
+    Loads the gallery page and downloads all of its images concurrently over a pool of
+    keep-alive connections, without a browser in the measurement. Requests that fail or take longer
+    than `timeout` seconds are counted as errors.
+    """
+
+    def __init__(self, url, iterations, concurrency=10, duration=None, timeout=30):
+        self.url = url
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.deadline = None
+        self.started = 0
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.recorder = LatencyRecorder()
+
+    async def _fetch(self, session, url, recorder):
+        """Downloads a resource, discarding the body as it arrives. Returns the body size."""
+        size = 0
+        start = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                if response.status >= 400:
+                    self.errors += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.errors += 1
+        recorder.record_request(time.perf_counter() - start)
+        self.requests += 1
+        self.bytes += size
+        return size
+
+    async def _load_gallery(self, session, recorder, intended_start=None):
+        """
+        Loads the gallery page, then fetches all of its images concurrently.
+        With an intended start time (perf_counter), page and iteration latency are measured from it,
+        so time spent waiting behind earlier requests is included; the client-side delay until the page
+        request is sent and the page's service latency are then recorded separately.
+        """
+        sent = time.perf_counter()
+        start = sent if intended_start is None else intended_start
+        if intended_start is not None:
+            recorder.record_queueing(sent - intended_start)
+        try:
+            async with session.get(self.url) as response:
+                html = await response.text()
+                failed = response.status >= 400
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            html, failed = "", True
+        answered = time.perf_counter()
+        recorder.record_request(answered - start)
+        if intended_start is not None:
+            recorder.record_service(answered - sent)
+        self.requests += 1
+        self.bytes += len(html)
+        if failed:
+            self.errors += 1
+            return
+        image_urls = parse_image_urls(html, self.url)
+        await asyncio.gather(*(self._fetch(session, url, recorder) for url in image_urls))
+        recorder.record_iteration(time.perf_counter() - start)
+
+    async def _worker(self, session):
+        """Runs iterations until all are taken or the deadline passes. Returns the worker's latency recorder."""
+        recorder = LatencyRecorder()
+        while self.started < self.iterations:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                break
+            self.started += 1
+            if self.duration is None:
+                print(f"Iteration {self.started}/{self.iterations}")
+            await self._load_gallery(session, recorder)
+        return recorder
+
+    async def run(self):
+        self.started = 0
+        if self.duration is not None:
+            self.deadline = time.perf_counter() + self.duration
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, force_close=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            recorders = await asyncio.gather(*(self._worker(session) for _ in range(self.concurrency)))
+        for recorder in recorders:
+            self.recorder.merge(recorder)
+
+    async def run_open_loop(self, schedule):
+        """
+        Issues gallery loads at the send times (seconds from start) of a schedule, regardless of
+        whether earlier loads have completed. At most `iterations` loads are issued, and none
+        after `duration` seconds when it is set. The connection pool is unbounded here: a bounded pool
+        would hold requests back on the client and turn the schedule back into a closed loop.
+        """
+        connector = aiohttp.TCPConnector(limit=0, force_close=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            tasks = []
+            start = time.perf_counter()
+            for i, offset in zip(range(self.iterations), schedule):
+                if self.duration is not None and offset >= self.duration:
+                    break
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self._load_gallery(session, self.recorder, start + offset)))
+            print(f"Issued {len(tasks)} gallery loads in {time.perf_counter() - start:.2f}s")
+            await asyncio.gather(*tasks)
+
+    def run_simulation(self, schedule=None):
+        """Runs all iterations (closed loop, or open loop following a schedule) and prints a throughput summary."""
+        start = time.perf_counter()
+        if schedule is None:
+            asyncio.run(self.run())
+        else:
+            asyncio.run(self.run_open_loop(schedule))
+        elapsed = time.perf_counter() - start
+        print(f"Completed {self.requests} requests ({self.errors} errors, {self.bytes / 1e6:.1f} MB) "
+              f"in {elapsed:.2f}s: {self.requests / elapsed:.1f} req/s")
+        self.recorder.print_summary()
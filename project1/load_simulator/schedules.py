@@ -0,0 +1,78 @@
+import random
+
+
+def constant_rate(rps, duration):
+    """Yields send times (seconds from start) at a fixed rate."""
+    interval = 1 / rps
+    t = 0.0
+    while t < duration:
+        yield t
+        t += interval
+
+
+def poisson(rps, duration, seed=None):
+    """Yields send times of Poisson arrivals, i.e. exponentially distributed gaps."""
+    rng = random.Random(seed)
+    t = rng.expovariate(rps)
+    while t < duration:
+        yield t
+        t += rng.expovariate(rps)
+
+
+def ramp(start_rps, end_rps, duration):
+    """Yields send times for a rate that changes linearly from start_rps to end_rps."""
+    t = 0.0
+    while t < duration:
+        yield t
+        rate = start_rps + (end_rps - start_rps) * t / duration
+        t += 1 / max(rate, 1e-3)
+
+
+def steps(levels):
+    """Yields send times for a sequence of (rps, seconds) steps at constant rate."""
+    offset = 0.0
+    for rps, seconds in levels:
+        for t in constant_rate(rps, seconds):
+            yield offset + t
+        offset += seconds
+
+
+def trace(path):
+    """Yields send times from a trace file with one timestamp (seconds) per line, relative to the first one."""
+    first = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                timestamp = float(line.split(",")[0])
+            except ValueError:
+                continue  # Header line
+            if first is None:
+                first = timestamp
+            yield timestamp - first
+
+
+def parse_schedule(spec, duration, seed=None):
+    """
+    Builds a schedule from a command line spec:
+    constant:<rps>, poisson:<rps>, ramp:<start_rps>:<end_rps>, steps:<rps>@<sec>,<rps>@<sec>,... or trace:<file>
+    """
+    kind, _, args = spec.partition(":")
+    if kind == "constant":
+        return constant_rate(float(args), duration)
+    if kind == "poisson":
+        return poisson(float(args), duration, seed)
+    if kind == "ramp":
+        start_rps, end_rps = args.split(":")
+        return ramp(float(start_rps), float(end_rps), duration)
+    if kind == "steps":
+        levels = []
+        for step in args.split(","):
+            rps, seconds = step.split("@")
+            levels.append((float(rps), float(seconds)))
+        return steps(levels)
+    if kind == "trace":
+        return trace(args)
+    raise ValueError(f"Unknown schedule: {spec}")
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from http_load import HttpLoadTester, parse_image_urls  # noqa: E402
+from schedules import constant_rate  # noqa: E402
+
+GALLERY = '<html><body><img src="/images/1.png"><img th:src="/images/2.png"><img src="/slow.png"></body></html>'
+
+
+class StubServer:
+    """ Gallery app on a free local port: two fast images and one that answers after `delay` seconds. """
+
+    def __init__(self, delay=0.0, gallery_delay=0.0):
+        self.delay = delay
+        self.gallery_delay = gallery_delay
+        self.runner = None
+        self.url = None
+
+    async def gallery(self, request):
+        await asyncio.sleep(self.gallery_delay)
+        return web.Response(text=GALLERY, content_type="text/html")
+
+    async def image(self, request):
+        return web.Response(body=b"x" * 1000, content_type="image/png")
+
+    async def slow(self, request):
+        await asyncio.sleep(self.delay)
+        return web.Response(body=b"x" * 1000, content_type="image/png")
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/gallery", self.gallery)
+        app.router.add_get("/images/{name}", self.image)
+        app.router.add_get("/slow.png", self.slow)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/gallery"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+class HttpLoadTesterTest(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse_image_urls(self):
+        urls = parse_image_urls(GALLERY, "http://localhost:8080/gallery")
+        self.assertEqual(urls, ["http://localhost:8080/images/1.png", "http://localhost:8080/images/2.png",
+                                "http://localhost:8080/slow.png"])
+
+    async def test_gallery_and_images(self):
+        async with StubServer() as server:
+            tester = HttpLoadTester(server.url, 2, concurrency=2)
+            await tester.run()
+        self.assertEqual(tester.requests, 8)
+        self.assertEqual(tester.errors, 0)
+        self.assertEqual(tester.bytes, 2 * (len(GALLERY) + 3000))
+
+    async def test_missing_gallery_is_an_error(self):
+        async with StubServer() as server:
+            tester = HttpLoadTester(server.url.replace("/gallery", "/missing"), 1, concurrency=1)
+            await tester.run()
+        self.assertEqual(tester.requests, 1)
+        self.assertEqual(tester.errors, 1)
+
+    async def test_slow_image_times_out(self):
+        async with StubServer(delay=2) as server:
+            tester = HttpLoadTester(server.url, 1, concurrency=1, timeout=0.5)
+            await tester.run()
+        self.assertEqual(tester.requests, 4)
+        self.assertEqual(tester.errors, 1)
+
+    async def test_slow_gallery_times_out(self):
+        async with StubServer(gallery_delay=2) as server:
+            tester = HttpLoadTester(server.url, 1, concurrency=1, timeout=0.5)
+            await tester.run()
+        self.assertEqual(tester.requests, 1)
+        self.assertEqual(tester.errors, 1)
+
+    async def test_open_loop_is_not_limited_by_the_pool(self):
+        async with StubServer(gallery_delay=0.3) as server:
+            tester = HttpLoadTester(server.url, 10, concurrency=1)
+            await tester.run_open_loop(constant_rate(20, 0.5))
+        self.assertEqual(tester.requests, 40)
+        self.assertEqual(tester.errors, 0)
+        self.assertEqual(tester.recorder.queueing.count, 10)
+        self.assertEqual(tester.recorder.service.count, 10)
+        # With a pool of one connection the last page would wait behind nine others for almost 3s
+        self.assertLess(tester.recorder.queueing.max / 1e6, 0.5)
+        self.assertLess(tester.recorder.iterations.max / 1e6, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
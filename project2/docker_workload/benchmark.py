@@ -1,8 +1,24 @@
+import argparse
+import copy
+import csv
+import ctypes
+import json
+import multiprocessing
+import os
+import queue
+import statistics
+import threading
 import torch
 import time
+from contextlib import contextmanager
 from torchvision import transforms
 from torchvision.models import resnet50, ResNet50_Weights
 
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+MEMORY_FORMATS = {"contiguous": torch.contiguous_format, "channels_last": torch.channels_last}
+# Prefix of the phase marker lines, which the measurement pipeline aligns with the energibridge samples
+PHASE_MARKER = "PHASE "
+
 torch.manual_seed(0)
 torch.cuda.manual_seed(0)
 torch.cuda.manual_seed_all(0)
@@ -10,37 +26,361 @@ torch.backends.cudnn.deterministic = True
 torch.backends.cudnn.benchmark = False
 
 
-device = 'cpu'
-if torch.cuda.is_available():
-   device = 'cuda'
-   
-print('Using {} device'.format(device))
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in
+                ("arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks",
+                 "keepcost")]
+
+
+def _load_mallinfo2():
+    try:
+        mallinfo2 = ctypes.CDLL(None).mallinfo2  # glibc >= 2.33
+    except (OSError, AttributeError):
+        return None
+    mallinfo2.restype = _MallInfo2
+    return mallinfo2
+
+
+_mallinfo2 = _load_mallinfo2()
+
+
+def heap_in_use():
+    """Bytes currently allocated from the C heap (glibc), or None when mallinfo2 is not available."""
+    if _mallinfo2 is None:
+        return None
+    info = _mallinfo2()
+    return info.uordblks + info.hblkhd
+
+
+class MemoryMonitor(threading.Thread):
+    """
+    Samples the resident set size and the heap in use of this process while a phase runs,
+    to report per-phase peaks (the kernel's ru_maxrss cannot be reset between phases).
+    On CUDA the allocator high-water mark comes from torch.cuda.max_memory_allocated instead.
+    Only used with --memory-profile, as the sampling thread competes with the measured workload.
+    """
+
+    def __init__(self, device, interval=0.05):
+        super().__init__(daemon=True)
+        self.device = device
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_heap = None
+        self._stop_event = threading.Event()
+        self._statm = os.open("/proc/self/statm", os.O_RDONLY)
+        if device == 'cuda':
+            torch.cuda.reset_peak_memory_stats()
+
+    def sample(self):
+        self.peak_rss = max(self.peak_rss, int(os.pread(self._statm, 128, 0).split()[1]) * PAGE_SIZE)
+        heap = heap_in_use()
+        if heap is not None:
+            self.peak_heap = max(self.peak_heap or 0, heap)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+        os.close(self._statm)
+        peak_allocated = torch.cuda.max_memory_allocated() if self.device == 'cuda' else self.peak_heap
+        return {"peak_rss": self.peak_rss, "peak_allocated": peak_allocated}
+
+
+@contextmanager
+def phase(name, device='cpu', memory_profile=False):
+    """
+    Prints a phase marker with the wall-clock (epoch) start and end of the enclosed block and,
+    with memory_profile, its peak RSS and allocator high-water mark (bytes).
+    The marker is also printed when the block raises, so a failed phase still covers its samples.
+    """
+    monitor = MemoryMonitor(device) if memory_profile else None
+    if monitor is not None:
+        monitor.start()
+    start = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        marker = {"phase": name, "start": start, "end": end, **(monitor.stop() if monitor is not None else {})}
+        print(PHASE_MARKER + json.dumps(marker), flush=True)
+
+
+def fixed_experiment(resnet, device, preprocess, memory_profile=False):
+    """The original experiment: batch size 1 at increasing input sizes (kept as is so results stay comparable)."""
+    input_sizes = [2 ** x for x in range(8,12)]
+    print(input_sizes)
+
+    for u,input_size in enumerate(input_sizes):
+        #number of inferences
+        iters = int(400/(u+1))
+
+        #create a random image
+        image_test = torch.rand(1,3,input_size,input_size)
+        image_test = preprocess(image_test)
+        image_test = image_test.to(device)
+
+
+        print(f'Experiment is running for image size {input_size}x{input_size}')
+        start_xp = time.time()
+
+        with phase(f"input_{input_size}", device, memory_profile):
+            for t in range(iters):
+                y = resnet(image_test)
+
+        end_xp = time.time()
+        print(f"Experiment took {end_xp-start_xp} seconds")
+
+
+def percentile(sorted_values, q):
+    """Percentile (0-100) of sorted values with linear interpolation."""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_configuration(model, device, preprocess, batch_size, input_size, memory_format, dtype, warmup_iters, iters):
+    """
+    Times `iters` batches after `warmup_iters` untimed ones, without autograd.
+    Returns the throughput (images/sec) and the per-batch latency percentiles (ms).
+    """
+    images = preprocess(torch.rand(batch_size, 3, input_size, input_size))
+    images = images.to(device, dtype).contiguous(memory_format=memory_format)
+
+    latencies = []
+    with torch.inference_mode():
+        for i in range(warmup_iters + iters):
+            start = time.perf_counter()
+            model(images)
+            if device == 'cuda':
+                torch.cuda.synchronize()
+            if i >= warmup_iters:
+                latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "throughput": batch_size * iters / sum(latencies),
+        "latency_mean_ms": statistics.mean(latencies) * 1000,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p90_ms": percentile(latencies, 90) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def sweep(resnet, device, preprocess, args):
+    """Runs every combination of memory format, dtype, batch size and input size; prints one JSON line per configuration."""
+    for format_name in args.memory_formats:
+        for dtype_name in args.dtypes:
+            model = copy.deepcopy(resnet).to(device, DTYPES[dtype_name], memory_format=MEMORY_FORMATS[format_name])
+            for batch_size in args.batch_sizes:
+                for input_size in args.input_sizes:
+                    result = {"device": device, "memory_format": format_name, "dtype": dtype_name,
+                              "batch_size": batch_size, "input_size": input_size, "iters": args.iters}
+                    start = time.time()
+                    try:
+                        with phase(f"{format_name}_{dtype_name}_batch{batch_size}_input{input_size}", device,
+                                   args.memory_profile):
+                            result.update(run_configuration(model, device, preprocess, batch_size, input_size,
+                                                            MEMORY_FORMATS[format_name], DTYPES[dtype_name],
+                                                            args.warmup_iters, args.iters))
+                    except RuntimeError as e:  # e.g. a dtype the device does not support, or out of memory
+                        result["error"] = str(e).splitlines()[0]
+                    result["start"], result["end"] = start, time.time()
+                    print(json.dumps(result), flush=True)
+            del model
+
+
+def scaling_worker(cores, threads, batch_size, input_size, warmup_iters, iters, barrier, results, timeout):
+    """
+    Replica of the scaling mode: pinned to its own cores, warms up, then times its batches after all replicas are ready.
+    Exits with an error when the other replicas are not ready within the timeout or the barrier is aborted.
+    """
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    model = resnet50(weights=ResNet50_Weights.DEFAULT).eval()
+    preprocess = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    images = preprocess(torch.rand(batch_size, 3, input_size, input_size))
+
+    latencies = []
+    with torch.inference_mode():
+        for _ in range(warmup_iters):
+            model(images)
+        barrier.wait(timeout)
+        start = time.time()
+        for _ in range(iters):
+            batch_start = time.perf_counter()
+            model(images)
+            latencies.append(time.perf_counter() - batch_start)
+        end = time.time()
+    results.put((start, end, latencies))
+
+
+def collect_results(processes, results, barrier, timeout):
+    """
+    Waits for the result of every replica. When a replica exits without one (e.g. killed when out of memory)
+    or the timeout passes, the barrier is aborted so no replica keeps waiting on it, all replicas are
+    terminated and a RuntimeError is raised.
+    """
+    deadline = time.monotonic() + timeout
+    replica_results = []
+    while len(replica_results) < len(processes):
+        try:
+            replica_results.append(results.get(timeout=1))
+            continue
+        except queue.Empty:
+            pass
+        failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+        if failed or time.monotonic() > deadline:
+            barrier.abort()
+            for process in processes:
+                process.terminate()
+                process.join()
+            if failed:
+                raise RuntimeError(f"{len(failed)} of {len(processes)} replicas failed (exit codes {failed})")
+            raise RuntimeError(f"{len(processes) - len(replica_results)} of {len(processes)} replicas "
+                               f"did not finish within {timeout}s")
+    return replica_results
+
+
+def run_replicas(cores, replicas, threads, args):
+    """
+    Runs `replicas` processes with `threads` intra-op threads each, every replica pinned to a disjoint set of cores.
+    Returns the aggregate throughput (images/sec) and the per-batch latency percentiles (ms) over all replicas.
+    Raises RuntimeError when a replica fails or the replicas do not finish within args.replica_timeout seconds.
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(replicas)
+    results = context.Queue()
+    processes = [context.Process(target=scaling_worker,
+                                 args=(cores[i * threads:(i + 1) * threads], threads, args.batch_sizes[0],
+                                       args.input_sizes[0], args.warmup_iters, args.iters, barrier, results,
+                                       args.replica_timeout))
+                 for i in range(replicas)]
+    for process in processes:
+        process.start()
+    replica_results = collect_results(processes, results, barrier, args.replica_timeout)
+    for process in processes:
+        process.join()
+
+    elapsed = max(end for _, end, _ in replica_results) - min(start for start, _, _ in replica_results)
+    latencies = sorted(latency for _, _, replica_latencies in replica_results for latency in replica_latencies)
+    return {
+        "throughput": replicas * args.batch_sizes[0] * args.iters / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def scaling(args):
+    """
+    CPU scaling mode: runs every combination of replica count and intra-op thread count that fits on the
+    available cores, prints one JSON line per configuration and writes the scaling curve to a CSV.
+    Speedup and efficiency are relative to one replica with one thread (efficiency = speedup / cores used).
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    configurations = [(1, 1)] + [(replicas, threads) for replicas in args.replicas for threads in args.threads
+                                 if replicas * threads <= len(cores) and (replicas, threads) != (1, 1)]
+    print(f"Scaling over {len(cores)} cores: {configurations}")
+
+    rows = []
+    baseline = None
+    for replicas, threads in configurations:
+        result = {"replicas": replicas, "threads": threads, "cores": replicas * threads,
+                  "batch_size": args.batch_sizes[0], "input_size": args.input_sizes[0], "iters": args.iters}
+        start = time.time()
+        result.update(run_replicas(cores, replicas, threads, args))
+        if baseline is None:
+            baseline = result["throughput"]
+        result["speedup"] = result["throughput"] / baseline
+        result["efficiency"] = result["speedup"] / result["cores"]
+        result["start"], result["end"] = start, time.time()
+        print(json.dumps(result), flush=True)
+        rows.append(result)
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda row: (row["cores"], row["replicas"])))
+    print(f"Scaling curve saved to {args.output}")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def choice_list(choices):
+    def parse(value):
+        values = value.split(",")
+        for v in values:
+            if v not in choices:
+                raise argparse.ArgumentTypeError(f"{v} is not one of {', '.join(choices)}")
+        return values
+    return parse
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ResNet-50 inference benchmark.")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Sweep batch sizes, input sizes, memory formats and dtypes instead of the fixed experiment.")
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 8, 32], help="Comma-separated batch sizes.")
+    parser.add_argument("--input-sizes", type=int_list, default=[224, 256, 512], help="Comma-separated input sizes.")
+    parser.add_argument("--memory-formats", type=choice_list(MEMORY_FORMATS), default=["contiguous", "channels_last"],
+                        help="Comma-separated memory formats (contiguous, channels_last).")
+    parser.add_argument("--dtypes", type=choice_list(DTYPES), default=["float32", "bfloat16"],
+                        help="Comma-separated dtypes (float32, bfloat16, float16).")
+    parser.add_argument("--warmup-iters", type=int, default=5, help="Untimed batches before each configuration.")
+    parser.add_argument("--iters", type=int, default=20, help="Timed batches per configuration.")
+    parser.add_argument("--device", choices=["cpu", "cuda"], help="Device (default: cuda when available).")
+    parser.add_argument("--scaling", action="store_true",
+                        help="CPU scaling mode: run replicas x threads configurations on disjoint cores "
+                             "(uses the first batch size and input size).")
+    parser.add_argument("--threads", type=int_list, default=[1, 2, 4, 8], help="Comma-separated intra-op thread counts.")
+    parser.add_argument("--replicas", type=int_list, default=[1, 2, 4, 8], help="Comma-separated replica counts.")
+    parser.add_argument("--output", default="scaling.csv", help="CSV file of the scaling curve.")
+    parser.add_argument("--replica-timeout", type=float, default=600,
+                        help="Seconds the replicas of one scaling configuration may take before they are stopped.")
+    parser.add_argument("--memory-profile", action="store_true",
+                        help="Also sample the peak RSS and allocated memory of every phase (adds a sampling thread, "
+                             "so leave it off for energy measurements).")
+    args = parser.parse_args()
 
-resnet = resnet50(weights=ResNet50_Weights.DEFAULT)
-resnet.to(device)
-resnet.eval()
+    if args.scaling:
+        try:
+            scaling(args)
+        except RuntimeError as e:
+            raise SystemExit(f"Scaling failed: {e}")
+        raise SystemExit
 
-input_sizes = [2 ** x for x in range(8,12)]
-print(input_sizes)
+    device = 'cpu'
+    if torch.cuda.is_available():
+       device = 'cuda'
+    if args.device is not None:
+       device = args.device
 
-preprocess = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    print('Using {} device'.format(device))
 
-for u,input_size in enumerate(input_sizes):
-    #number of inferences
-    iters = int(400/(u+1))
 
-    #create a random image
-    image_test = torch.rand(1,3,input_size,input_size)
-    image_test = preprocess(image_test)
-    image_test = image_test.to(device)
+    with phase("model_load", device, args.memory_profile):
+        resnet = resnet50(weights=ResNet50_Weights.DEFAULT)
+        resnet.to(device)
+        resnet.eval()
 
+    preprocess = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
 
-    print(f'Experiment is running for image size {input_size}x{input_size}')
-    start_xp = time.time()
+    if args.sweep:
+        sweep(resnet, device, preprocess, args)
+    else:
+        fixed_experiment(resnet, device, preprocess, args.memory_profile)
 
-    for t in range(iters):
-        y = resnet(image_test)
-        
-    end_xp = time.time()
-    print(f"Experiment took {end_xp-start_xp} seconds")
+    with phase("teardown", device, args.memory_profile):
+        del resnet
+        if device == 'cuda':
+            torch.cuda.empty_cache()
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+DEFAULT_DIGESTS = "./deployment/image_digests.json"
+
+
+def docker(*args):
+    """Runs a docker CLI command and returns its stripped output."""
+    result = subprocess.run(["docker", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"docker {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def image_digest(image):
+    """Returns the repository digest of a local image, or its ID for images without one (e.g. loaded from an archive)."""
+    digests = json.loads(docker("image", "inspect", "--format", "{{json .RepoDigests}}", image))
+    return digests[0].split("@", 1)[1] if digests else docker("image", "inspect", "--format", "{{.Id}}", image)
+
+
+def image_present(image):
+    return subprocess.run(["docker", "image", "inspect", image], capture_output=True).returncode == 0
+
+
+def prestage(image, archive=None, expected_digest=None):
+    """
+    Makes sure an image is available locally before any measured run: loads it from an archive (docker save
+    output) when given, pulls it when it is missing, and checks its digest against the expected one.
+    Returns the digest.
+    """
+    start = time.monotonic()
+    if archive is not None:
+        docker("load", "-i", archive)
+        action = f"Loaded {image} from {archive}"
+    elif not image_present(image):
+        docker("pull", image)
+        action = f"Pulled {image}"
+    else:
+        action = f"Found {image} locally"
+    digest = image_digest(image)
+    print(f"{action} in {time.monotonic() - start:.1f}s ({digest})")
+
+    if expected_digest is not None and digest != expected_digest:
+        raise ValueError(f"Digest of {image} is {digest}, expected {expected_digest}")
+    return digest
+
+
+def load_digests(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_digests(digests, path):
+    with open(path, "w") as f:
+        json.dump(digests, f, indent=2)
+
+
+def parse_docker_time(value):
+    """Parses a docker timestamp (RFC 3339 with nanoseconds, e.g. 2025-03-01T10:00:00.123456789Z) to epoch seconds."""
+    value = value.rstrip("Z")
+    if "." in value:
+        whole, fraction = value.split(".", 1)
+        value = f"{whole}.{fraction[:6]}"
+    return datetime.fromisoformat(value + "+00:00").timestamp()
+
+
+class Container:
+    """
+    A container created outside the measured window. Only `docker start -a` runs under energibridge,
+    so creation is timed separately and the container's own start and exit times are read back afterwards.
+    """
+
+    def __init__(self, image, args=(), name=None):
+        options = ["--name", name] if name else []
+        start = time.monotonic()
+        # --pull=never: a missing image must fail instead of being pulled during a measured run
+        self.id = docker("create", "--pull=never", *options, image, *args)
+        self.create_time = time.monotonic() - start
+
+    def start_command(self):
+        return f"docker start -a {self.id}"
+
+    def timings(self, launched_at):
+        """
+        Returns the create time, the startup time (from launching the measured command at epoch `launched_at`
+        until the container started), the container runtime and its exit code.
+        """
+        state = json.loads(docker("inspect", "--format", "{{json .State}}", self.id))
+        started = parse_docker_time(state["StartedAt"])
+        finished = parse_docker_time(state["FinishedAt"])
+        return {"create_time": self.create_time, "startup_time": started - launched_at,
+                "container_time": finished - started, "exit_code": state["ExitCode"]}
+
+    def remove(self):
+        docker("rm", "-f", self.id)
@@ -0,0 +1,70 @@
+import json
+import os
+import time
+
+DEFAULT_JOURNAL = "./deployment/campaign_journal.jsonl"
+
+
+class RunJournal:
+    """
+    Append-only journal of a measurement campaign: one JSON line per event of an (image, run) unit
+    (planned, started, done or failed). Every line is flushed and fsynced before the run continues,
+    so after a crash or reboot the journal tells exactly which units finished.
+    A new campaign starts with a "campaign" line; only the events after the last one are considered.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL):
+        self.path = path
+        self.units = {}
+        self.campaign_started = None
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line cut off by a crash
+                if entry.get("status") == "campaign":
+                    self.units = {}
+                    self.campaign_started = entry["timestamp"]
+                else:
+                    self.units[(entry["image"], entry["run"])] = entry
+
+    def _append(self, entry):
+        entry["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def new_campaign(self):
+        """Starts a new campaign; the units of earlier campaigns are no longer considered."""
+        entry = {"status": "campaign"}
+        self._append(entry)
+        self.units = {}
+        self.campaign_started = entry["timestamp"]
+
+    def record(self, image, run, status, **result):
+        entry = {"image": image, "run": run, "status": status, **result}
+        self._append(entry)
+        self.units[(image, run)] = entry
+
+    def plan(self, units):
+        """Records the (image, run) units that are not in the journal yet as planned."""
+        for image, run in units:
+            if (image, run) not in self.units:
+                self.record(image, run, "planned")
+
+    def status(self, image, run):
+        entry = self.units.get((image, run))
+        return entry["status"] if entry else None
+
+    def completed(self, image):
+        """Returns {run: entry} of the finished runs of an image."""
+        return {run: entry for (name, run), entry in self.units.items() if name == image and entry["status"] == "done"}
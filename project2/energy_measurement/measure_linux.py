@@ -1,19 +1,111 @@
 import argparse
+import random
+import shlex
+import sqlite3
 import subprocess
 import time
 import os
 import csv, re
+import pandas as pd
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "project1", "energy_testing"))
+from attribution import CGROUP_ROOT, CgroupAttributor, find_container_cgroup  # noqa: E402
+from samplers import get_sampler  # noqa: E402
+from sampling import SamplingThread  # noqa: E402
+from steady_state import SteadyStateDetector  # noqa: E402
+from stopping import SequentialStopper  # noqa: E402
+
+from containers import DEFAULT_DIGESTS, Container, load_digests, prestage, save_digests  # noqa: E402
+from journal import DEFAULT_JOURNAL, RunJournal  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "visualizations"))
+from results_db import ResultsDB, energibridge_samples  # noqa: E402
+
+SUMMARY_PATTERN = re.compile(r"Energy consumption in joules:\s*([\d.]+)\s*for\s*([\d.]+)\s*sec")
+TIMING_FIELDS = ["run", "create_time", "startup_time", "container_time", "exit_code", "error"]
+ATTRIBUTION_FIELDS = ["run", "container_energy", "other_energy", "system_energy", "cpu_share", "peak_memory",
+                      "io_read", "io_written", "samples"]
+
+
+class ContainerEnergyMonitor:
+    """
+    Splits package energy between a container and the rest of the machine while it runs. A background thread
+    waits for the container's cgroup to appear, then samples system power and the cgroup's CPU share at a fixed
+    cadence until stopped.
+    """
+
+    def __init__(self, container_id, sampler, interval=0.1, cgroup_root=CGROUP_ROOT):
+        self.container_id = container_id
+        self.sampler = sampler
+        self.interval = interval
+        self.cgroup_root = cgroup_root
+        self.attributor = None
+        self.sampling = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._attach, daemon=True)
+
+    def _attach(self):
+        while not self._stop_event.is_set():
+            path = find_container_cgroup(self.container_id, self.cgroup_root)
+            if path is not None:
+                self.attributor = CgroupAttributor(path, self.cgroup_root)
+                self.sampler.read()  # Start the power average at the container start
+                self.sampling = SamplingThread(self.sampler, self.attributor, self.interval)
+                self.sampling.start()
+                return
+            self._stop_event.wait(0.01)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and returns the attribution of the run, or None when the container never started."""
+        self._stop_event.set()
+        self._thread.join()
+        if self.sampling is None:
+            return None
+        self.sampling.stop()
+        self.attributor.close()
+        summary = self.sampling.summary()
+        system, container = summary["system_energy"], summary["process_energy"]
+        return {"container_energy": container, "other_energy": system - container, "system_energy": system,
+                "cpu_share": container / system if system > 0 else 0.0,
+                "peak_memory": self.attributor.peak_memory(), "io_read": self.attributor.io_read,
+                "io_written": self.attributor.io_written, "samples": summary["samples"]}
 
 class EnergyMeasurement:
-    def __init__(self, workload_name, runs, warmup_time, pause_time):
+    def __init__(self, workload_name, runs, warmup_time, pause_time, detector=None, min_warmup=0, min_pause=0,
+                 target_ci=None, min_runs=10, journal=None, sampler=None, cgroup_root=CGROUP_ROOT,
+                 db=None, campaign_id=None):
         self.workload_name = workload_name
         self.workload_dir = os.path.abspath(f"./deployment/{workload_name}")
         self.runs = runs
+        # With a target CI half-width, runs is the maximum and the campaign stops once the energy mean converges
+        self.target_ci = target_ci
+        self.min_runs = min_runs
+        self.stopper = None
+        self.journal = journal
+        # With a power sampler, package energy is attributed to the container through its cgroup
+        self.sampler = sampler
+        self.cgroup_root = cgroup_root
+        # Every finished run is also stored in the results database, with its energibridge samples
+        self.db = db
+        self.campaign_id = campaign_id
         self.warmup_time = warmup_time
         self.pause_time = pause_time
+        # With a steady-state detector, warm-up and pause times are upper bounds
+        self.detector = detector
+        self.min_warmup = min_warmup
+        self.min_pause = min_pause
         self.log_file = f"{self.workload_dir}/energy_logs_{self.workload_name}.txt"
         self.results_file = f"{self.workload_dir}/results/energy_results_{self.workload_name}"
         self.measurements_file = f"{self.workload_dir}/energy_measurements_{self.workload_name}.csv"
+        self.timings_file = f"{self.workload_dir}/container_timings_{self.workload_name}.csv"
+        self.attribution_file = f"{self.workload_dir}/container_energy_{self.workload_name}.csv"
+        # Arguments of the workload container, e.g. for an idle run: ["/bin/bash", "-c", "sleep 180"]
+        self.container_args = []
         
 
     def fibonacci_warmup(self, n=35):
@@ -24,45 +116,46 @@ class EnergyMeasurement:
             return fib(n - 1) + fib(n - 2)
         
         #print(f"Performing Fibonacci warm-up for {self.warmup_time} seconds...")
-        start_time = time.time()
-        while time.time() - start_time < self.warmup_time:
-            fib(n)
+        if self.detector is not None:
+            self.detector.warm_up(lambda: fib(n), self.min_warmup, self.warmup_time)
+        else:
+            start_time = time.time()
+            while time.time() - start_time < self.warmup_time:
+                fib(n)
         print("Warm-up complete.")
 
-    def parse_results(self, run_nr):
-        # Open the log file and read it in reverse
-        try:
-            with open(self.measurements_file, "r") as f:
-                lines = f.readlines()
-            
-            # Reverse the lines to find the last match
-            lines.reverse()
-            result = None
-
-            # Search for the last match of the pattern in the reversed lines
-            for line in lines:
-                match = re.search(r"Energy consumption in joules:\s*([\d.]+)\s*for\s*([\d.]+)\s*sec", line)
-                if match:
-                    result = match
-                    break  # Once we find the last match, stop the search
-
-            # If a match is found, extract the energy and time
-            if result:
-                energy = float(result.group(1))
-                time_taken = float(result.group(2))
-          
-                # Write the results to a CSV file
-                with open(self.measurements_file, "a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([run_nr, energy, time_taken])
-            else:
-                print("Energy and time data not found in output.")
-        except FileNotFoundError:
-            print(f"The file {self.measurements_file} was not found.")
-
-    
+    def cool_down(self, max_time=None):
+        """Pauses until the system is back in a steady state, for at most max_time (default: pause time)."""
+        max_time = self.pause_time if max_time is None else max_time
+        if self.detector is not None:
+            self.detector.cool_down(self.min_pause, max_time)
+        else:
+            time.sleep(max_time)
+
+    def parse_results(self, record):
+        """Appends the energy and time of a run record to the measurements CSV."""
+        if record["energy"] is None:
+            print("Energy and time data not found in output.")
+            return
+
+        with open(self.measurements_file, "a", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([record["run"], record["energy"], record["time"]])
+
+    def save_record(self, path, fields, record):
+        """Appends the given fields of a run record to a CSV (e.g. the container timings)."""
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            if new_file:
+                writer.writeheader()
+            writer.writerow(record)
+
     def run_workload(self, command, run_nr):
-        """Runs a docker command and records the enrgy measurement"""
+        """
+        Runs a docker command under energibridge. The output is streamed line by line into the log file
+        while the energy summary is extracted from it. Returns the run record.
+        """
         energibridge_path = "./energy_measurement/energibridge_folder/energibridge"
 
         if not os.path.isfile(energibridge_path):
@@ -74,60 +167,267 @@ class EnergyMeasurement:
         env['CUDA_VISIBLE_DEVICES'] = '0'  
 
         command = f"sudo -S ../../energy_measurement/energibridge_folder/energibridge -o {output_per_run} -g -i 10000 --summary {command}"
-        
+        record = {"run": run_nr, "energy": None, "time": None, "returncode": None}
+
         with open(self.log_file, "a") as log:
             try:
-                result = subprocess.run(command, shell=True, check=True, input="Florawinx1!", text=True, stdout=log, stderr=log, cwd=self.workload_dir, env=env)
-                return None
+                process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, text=True, cwd=self.workload_dir, env=env)
+                process.stdin.write("Florawinx1!")
+                process.stdin.close()
+                for line in process.stdout:
+                    log.write(line)
+                    match = SUMMARY_PATTERN.search(line)
+                    if match:
+                        record["energy"] = float(match.group(1))
+                        record["time"] = float(match.group(2))
+                record["returncode"] = process.wait()
+                if record["returncode"] != 0:
+                    print(f"Command exited with status {record['returncode']}")
             except Exception as e:
                 print(f"Error running command: {e}")
-                return None
+        return record
         
         
-    def run_measurements(self, command):
-        """Runs the measurement process multiple times."""
-        
-        with open(self.measurements_file, "w", newline="") as f:
+    def prepare(self, resume=False):
+        """
+        Prepares the measurements CSV and the stopping rule. When resuming a campaign in which the journal already
+        has runs of this image, its CSVs are kept and the runs recorded as done are restored; otherwise the
+        measurements, timings and attribution CSVs start fresh. Returns the runs that still have to be measured.
+        """
+        measured = self.journal is not None and any(
+            image == self.workload_name and entry["status"] != "planned"
+            for (image, _), entry in self.journal.units.items())
+        if not (resume and measured and os.path.exists(self.measurements_file)):
+            with open(self.measurements_file, "w", newline="") as f:
                 writer = csv.writer(f)
-                writer.writerow(["Run", "Energy (J)", "Time (sec)"]) 
+                writer.writerow(["Run", "Energy (J)", "Time (sec)"])
+            for path in (self.timings_file, self.attribution_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if self.target_ci is not None:
+            self.stopper = SequentialStopper(self.target_ci, self.min_runs, self.runs)
 
-        for run in range(self.runs):
+        completed = self.journal.completed(self.workload_name) if resume and self.journal is not None else {}
+        for run in sorted(completed):
+            if self.stopper is not None:
+                self.stopper.update(completed[run]["energy"])
+        if completed:
+            print(f"Resuming {self.workload_name}: {len(completed)} runs already done.")
+        return [run for run in range(self.runs) if run not in completed]
+
+    def converged(self):
+        return self.stopper is not None and self.stopper.converged()
+
+    def measure_run(self, image, run):
+        """
+        Measures one run of an image, recording it in the journal. The container is created before and removed
+        after the measured window; only its start and execution run under energibridge.
+        Failed runs, including docker errors around the container, are not written to the measurements CSV
+        but are recorded as failed in the journal and the timings CSV.
+        """
+        if self.journal is not None:
+            self.journal.record(self.workload_name, run, "started")
+
+        record = {"run": run, "energy": None, "time": None, "returncode": None}
+        attribution = None
+        try:
+            container = Container(image, self.container_args)
+        except RuntimeError as e:
+            record["error"] = str(e)
+            container = None
+        if container is not None:
+            monitor = None
+            if self.sampler is not None:
+                monitor = ContainerEnergyMonitor(container.id, self.sampler, cgroup_root=self.cgroup_root)
+                monitor.start()
+            try:
+                launched_at = time.time()
+                record = self.run_workload(container.start_command(), run)
+                try:
+                    record.update(container.timings(launched_at))
+                except (RuntimeError, KeyError, ValueError) as e:
+                    record["error"] = str(e)
+            finally:
+                attribution = monitor.stop() if monitor is not None else None
+                try:
+                    container.remove()
+                except RuntimeError as e:
+                    print(f"Could not remove container {container.id}: {e}")
+        self.save_record(self.timings_file, TIMING_FIELDS, record)
+        if "error" in record:
+            print(f"Container error: {record['error']}")
+        else:
+            print(f"Container created in {record['create_time']:.2f}s, started after {record['startup_time']:.2f}s, "
+                  f"ran for {record['container_time']:.1f}s")
+        if attribution is not None:
+            record.update(attribution)
+            self.save_record(self.attribution_file, ATTRIBUTION_FIELDS, record)
+            print(f"Container energy {attribution['container_energy']:.1f} J of {attribution['system_energy']:.1f} J "
+                  f"package energy ({attribution['cpu_share']:.1%})")
+
+        failed = record["energy"] is None or record["returncode"] != 0 or record.get("exit_code") != 0
+        if failed:
+            print(f"Run {run + 1} of {self.workload_name} failed.")
+        else:
+            self.parse_results(record)
+            if self.stopper is not None:
+                self.stopper.update(record["energy"])
+                print(self.stopper.status())
+
+        # The database is written before the journal marks the run as finished, so a resume never skips a run
+        # that is missing from the database
+        if self.db is not None:
+            try:
+                self.store_run(record, failed)
+            except sqlite3.Error as e:
+                print(f"Could not store run {run + 1} of {self.workload_name} in the results database: {e}")
+        if self.journal is not None:
+            self.journal.record(self.workload_name, run, "failed" if failed else "done",
+                                **{key: value for key, value in record.items() if key != "run"})
+        return record
+
+    def store_run(self, record, failed):
+        """Inserts a run, its summary and its energibridge samples into the results database in one transaction."""
+        output_per_run = f"{self.results_file}_{record['run']}.csv"
+        samples = pd.read_csv(output_per_run) if os.path.exists(output_per_run) else None
+        extra = {key: value for key, value in record.items() if key not in ("run", "energy", "time")}
+        self.db.add_run(self.campaign_id, {
+            "variant": self.workload_name, "run": record["run"], "status": "failed" if failed else "done",
+            "started_at": samples["Time"].iloc[0] / 1000 if samples is not None and len(samples) else None,
+            "energy": record["energy"], "duration": record["time"], "extra": extra,
+            "samples": energibridge_samples(samples) if samples is not None else None})
+
+    def run_measurements(self, image, pending=None):
+        """Runs the measurement process multiple times (only the pending runs when given)."""
+        if pending is None:
+            pending = self.prepare()
+
+        for run in pending:
+            if self.converged():
+                break
             print(f"Run {run + 1}/{self.runs}")
 
-            self.run_workload(command, run)
-            self.parse_results(run)
+            self.measure_run(image, run)
+            if self.converged():
+                print(f"Energy estimate converged after {self.stopper.n} runs.")
+                break
 
             #print(f"Sleeping for {self.pause_time} seconds before next run...")
 
-            time.sleep(self.pause_time)  # Pause before next run
+            self.cool_down()  # Pause before next run
             
                
         print(f"All measurements completed.")
 
+
+def run_interleaved(campaign, resume=False, seed=None):
+    """
+    Measures all images in one sequence of rounds: round i runs the i-th run of every image in a random order,
+    so drift over the night (temperature, background load) is spread over all images instead of hitting one.
+    """
+    rng = random.Random(seed)
+    pending = {measurement.workload_name: set(measurement.prepare(resume)) for measurement, _ in campaign}
+    campaign[0][0].fibonacci_warmup()
+
+    for run in range(max(measurement.runs for measurement, _ in campaign)):
+        order = list(campaign)
+        rng.shuffle(order)
+        for measurement, image in order:
+            if run not in pending[measurement.workload_name] or measurement.converged():
+                continue
+            print(f"Run {run + 1}/{measurement.runs} of {measurement.workload_name}")
+            measurement.measure_run(image, run)
+            measurement.cool_down()
+
+    print(f"All measurements completed.")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Measure energy usage of a Docker container using EnergyBridge.")
-    parser.add_argument("-n", "--runs", type=int, default=30, help="Number of monitoring runs.")
+    parser.add_argument("-n", "--runs", type=int, default=30,
+                        help="Number of monitoring runs (maximum number with --target-ci).")
+    parser.add_argument("--target-ci", type=float,
+                        help="Stop an image once the 95%% CI half-width of its mean energy is below this "
+                             "fraction of the mean (e.g. 0.02).")
+    parser.add_argument("--min-runs", type=int, default=10, help="Minimum number of runs with --target-ci.")
     parser.add_argument("-w", "--warmup", type=int, default=60, help="Warm-up time (seconds).")
     parser.add_argument("-p", "--pause", type=int, default=60, help="Pause time between runs (seconds).")
+    parser.add_argument("--fixed-pauses", action="store_true",
+                        help="Always warm up and pause for the full time instead of until the system is stable.")
+    parser.add_argument("--min-warmup", type=int, default=10, help="Minimum warm-up time (seconds).")
+    parser.add_argument("--min-pause", type=int, default=10, help="Minimum pause time between runs (seconds).")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Relative spread of power, frequency and temperature considered stable.")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL, help="Journal recording the status of every run.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the campaign in the journal, only measuring missing or failed runs.")
+    parser.add_argument("--interleave", action="store_true",
+                        help="Interleave the images in a random order every run instead of measuring one after another.")
+    parser.add_argument("--seed", type=int, help="Seed of the interleaving order.")
+    parser.add_argument("--attribution", action="store_true",
+                        help="Also split package energy between the container and the rest of the machine "
+                             "by CPU time, using the container's cgroup v2.")
+    parser.add_argument("--sampler", choices=["powermetrics", "rapl", "replay"], default="rapl",
+                        help="Power source of the attribution.")
+    parser.add_argument("--trace", help="Recorded power trace for the replay sampler")
+    parser.add_argument("--cgroup-root", default=CGROUP_ROOT, help="Mount point of the cgroup v2 hierarchy.")
+    parser.add_argument("--db", help="Also store every run in this results database (e.g. ./deployment/results.db).")
+    parser.add_argument("--container-command",
+                        help='Command run in the containers instead of their default, e.g. "python benchmark.py --sweep".')
+    parser.add_argument("--archives", help="Directory with <name>.tar image archives (docker save) to load "
+                                           "instead of pulling the images.")
+    parser.add_argument("--digests", help="JSON file with the expected digest of every image "
+                                          f"(default with --resume: the digests recorded in {DEFAULT_DIGESTS}).")
 
     args = parser.parse_args()
+    detector = None if args.fixed_pauses else SteadyStateDetector(tolerance=args.tolerance)
+    journal = RunJournal(args.journal)
+    if not args.resume or journal.campaign_started is None:
+        journal.new_campaign()
         
     image_names = ["ubuntu", "pytorch-base", "python-base", "cuda-base"]
 
-    for image_name in image_names:
-        print(f"Image {image_name}")
-        # Command for idle run
-        # command_hub = f'docker run --rm luciantosa/resnet50:{image_name} /bin/bash -c "sleep 180"'
-        command_hub = f"docker run luciantosa/resnet50:{image_name}"
-        runs = args.runs
-        
-        measurement = EnergyMeasurement(image_name, runs, args.warmup, args.pause)
-        measurement.fibonacci_warmup()
-        measurement.run_measurements(command_hub)
-        time.sleep(60) # Pause between different image runs
-
+    images = {image_name: f"luciantosa/resnet50:{image_name}" for image_name in image_names}
     # Running last image 
-    command_hub = f"docker run --rm quay.io/luci_tosa11/resnet50:nvcr"
-    measurement = EnergyMeasurement("nvcr", runs, args.warmup, args.pause)
-    measurement.fibonacci_warmup()
-    measurement.run_measurements(command_hub)
\ No newline at end of file
+    images["nvcr"] = "quay.io/luci_tosa11/resnet50:nvcr"
+
+    # Pull (or load) every image before the first measured run, so no download ends up in the energy numbers
+    expected = load_digests(args.digests or (DEFAULT_DIGESTS if args.resume else ""))
+    digests = {}
+    for image_name, image in images.items():
+        archive = os.path.join(args.archives, f"{image_name}.tar") if args.archives else None
+        digests[image] = prestage(image, archive, expected.get(image))
+    save_digests(digests, DEFAULT_DIGESTS)
+
+    sampler = get_sampler(args.sampler, args.trace) if args.attribution else None
+    db = ResultsDB(args.db) if args.db else None
+    campaign_id = None
+    if db is not None:
+        # The campaign is identified by the start of the journal's campaign, so a resumed campaign continues it
+        campaign_id = db.campaign(f"measure_linux {journal.campaign_started}", "measure_linux",
+                                  time.mktime(time.strptime(journal.campaign_started, "%Y-%m-%dT%H:%M:%S")),
+                                  {"images": images, "digests": digests})
+    campaign = [(EnergyMeasurement(image_name, args.runs, args.warmup, args.pause, detector, args.min_warmup,
+                                   args.min_pause, args.target_ci, args.min_runs, journal, sampler, args.cgroup_root,
+                                   db, campaign_id),
+                 image)
+                for image_name, image in images.items()]
+    if args.container_command:
+        for measurement, _ in campaign:
+            measurement.container_args = shlex.split(args.container_command)
+    journal.plan((measurement.workload_name, run) for measurement, _ in campaign for run in range(args.runs))
+
+    if args.interleave:
+        run_interleaved(campaign, args.resume, args.seed)
+    else:
+        for i, (measurement, image) in enumerate(campaign):
+            print(f"Image {measurement.workload_name}")
+            pending = measurement.prepare(args.resume)
+            if not pending or measurement.converged():
+                print(f"All runs of {measurement.workload_name} are done.")
+                continue
+            measurement.fibonacci_warmup()
+            measurement.run_measurements(image, pending)
+            if i < len(campaign) - 1:
+                measurement.cool_down(60) # Pause between different image runs
\ No newline at end of file
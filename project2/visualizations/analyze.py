@@ -4,11 +4,28 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 from scipy.stats import shapiro, ttest_ind
 import scipy.stats as stats
+import argparse
+import hashlib
 import itertools
+import os
 import scipy.stats as stats
 import scikit_posthocs as sp
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
+from statsmodels.stats.multitest import multipletests
+
+from bootstrap import bootstrap_ci, bootstrap_distributions
+from cache import ResultCache, file_hash
+from process_results import extract_all
+from results_db import DEFAULT_DB, ResultsDB, normalize_variant, parse_date
+
+ENERGY_COLUMN = "Energy Consumption (Joules)"
+# Pairwise comparisons are spread over a process pool from this many variants on
+PARALLEL_MIN_VARIANTS = 12
+# Version of every cached analysis step: bump it when the step's code changes, so results of the old code are not reused
+STEP_VERSIONS = {"perform_statistical_test": 1, "analyze_variants": 1, "cliffs_delta_ci": 1,
+                 "bootstrap_distributions": 1, "comparison_matrices": 1}
 
 
 def load_and_label_data(csv_files):
@@ -21,19 +38,83 @@ def load_and_label_data(csv_files):
     Returns:
         pd.DataFrame: Combined DataFrame with all variants.
         dict: Dictionary of DataFrames for individual variants.
+        dict: Content hash of the file(s) labeled as each variant, for the analysis cache.
     """
     dataframes = {}
     combined_data = []
+    file_hashes = {}
     
     for file in csv_files:
         df = pd.read_csv(file)
         #variant_name = file.split(".csv")[0]  # Extract filename as variant label
-        variant_name = file.replace("_output.csv", "")
+        variant_name = os.path.basename(file).replace("_output.csv", "")
         df["Variant"] = variant_name
-        dataframes[variant_name] = df
+        # Files sharing a basename label the same variant, which then holds the rows of all of them
+        if variant_name in dataframes:
+            dataframes[variant_name] = pd.concat([dataframes[variant_name], df], ignore_index=True)
+        else:
+            dataframes[variant_name] = df
+        file_hashes.setdefault(variant_name, []).append(file_hash(file))
         combined_data.append(df)
-    
-    return pd.concat(combined_data, ignore_index=True), dataframes
+
+    hashes = {variant: values[0] if len(values) == 1 else hashlib.sha256("".join(values).encode()).hexdigest()
+              for variant, values in file_hashes.items()}
+    return pd.concat(combined_data, ignore_index=True), dataframes, hashes
+
+def load_from_db(db_path, variants=None, campaigns=None, since=None, until=None, all_campaigns=False):
+    """
+    Queries the runs to analyze from the results database instead of reading CSV files.
+
+    Args:
+        db_path (str): SQLite results database.
+        variants (list of str): Variants to include (default: all).
+        campaigns (list of str): Campaigns to include (default: the latest campaign of each variant).
+        since (float): Only runs started at or after this epoch time.
+        until (float): Only runs started before this epoch time.
+        all_campaigns (bool): Without campaigns, include all campaigns instead of the latest one of each variant.
+
+    Returns:
+        pd.DataFrame: Combined DataFrame with all variants.
+        dict: Dictionary of DataFrames for individual variants.
+        dict: Content hash of the runs of each variant (the columns an *_output.csv file holds), for the analysis cache.
+
+    Raises:
+        ValueError: When a requested variant (or, without variants, any variant) has no runs matching the filters.
+    """
+    db = ResultsDB(db_path)
+    combined_data = db.query_runs(variants, campaigns, since, until, all_campaigns=all_campaigns)
+    db.close()
+    missing = [variant for variant in variants or [] if normalize_variant(variant) not in set(combined_data["Variant"])]
+    if missing or combined_data.empty:
+        raise ValueError(f"No runs in {db_path} matching the filters for variant(s): {', '.join(missing or ['any'])}")
+    dataframes = {variant: df.reset_index(drop=True) for variant, df in combined_data.groupby("Variant", sort=False)}
+    hashes = {variant: hashlib.sha256(df[["Run", ENERGY_COLUMN, "Execution Time (Seconds)"]]
+                                      .to_csv(index=False).encode()).hexdigest()
+              for variant, df in dataframes.items()}
+    return combined_data, dataframes, hashes
+
+def build_variant_groups(data, column=ENERGY_COLUMN):
+    """
+    Splits the combined data into one contiguous NumPy array per variant in a single grouped pass,
+    and computes the summary statistics of every variant.
+
+    Args:
+        data (pd.DataFrame): The dataset containing 'Variant' and the value column.
+        column (str): The column to extract.
+
+    Returns:
+        dict: Contiguous float64 array of values for each variant, in order of first appearance.
+        pd.DataFrame: Count, mean, median and standard deviation per variant.
+    """
+    groups = {variant: np.ascontiguousarray(values, dtype=np.float64)
+              for variant, values in data.groupby("Variant", sort=False)[column]}
+    summary = pd.DataFrame({
+        "count": {variant: len(values) for variant, values in groups.items()},
+        "mean": {variant: values.mean() for variant, values in groups.items()},
+        "median": {variant: np.median(values) for variant, values in groups.items()},
+        "std": {variant: values.std(ddof=1) if len(values) > 1 else np.nan for variant, values in groups.items()},
+    })
+    return groups, summary
 
 def plot_violin_energy(data):
     """
@@ -219,21 +300,100 @@ def summarize_data(data):
     print(summary.to_string(float_format="%.2f"))
 
 
+def _dominance_counts(x, y_sorted):
+    """
+    For every value in x, counts the values of the sorted array y_sorted that are smaller and larger.
+    Ties fall in neither count.
+    """
+    less_than_x = np.searchsorted(y_sorted, x, side="left")
+    greater_than_x = len(y_sorted) - np.searchsorted(y_sorted, x, side="right")
+    return less_than_x, greater_than_x
+
 def cliffs_delta(x, y):
     """
     Computes Cliff's Delta, a measure of effect size for ordinal data.
     - Values near 0: Little to no effect.
     - Values near ±1: Strong effect.
+
+    Sorts y once and counts the dominance of every x value with a binary search, which takes
+    O((n_x + n_y) log n_y) instead of comparing all pairs.
     
     Returns:
         delta (float): Cliff's Delta value.
     """
-    x, y = np.array(x), np.array(y)
+    x, y = np.asarray(x), np.sort(np.asarray(y))
     n_x, n_y = len(x), len(y)
-    greater = sum((xi > yi) for xi in x for yi in y)
-    less = sum((xi < yi) for xi in x for yi in y)
+    less_than_x, greater_than_x = _dominance_counts(x, y)
+    greater = int(less_than_x.sum())
+    less = int(greater_than_x.sum())
     return (greater - less) / (n_x * n_y)
 
+def cliffs_delta_ci(x, y, confidence=0.95):
+    """
+    Computes Cliff's Delta with an asymmetric confidence interval based on Cliff's (1993)
+    consistent variance estimate. All terms are derived from dominance counts, so no pairwise
+    matrix is built.
+
+    Returns:
+        tuple: (delta, lower bound, upper bound)
+    """
+    x, y = np.sort(np.asarray(x)), np.sort(np.asarray(y))
+    n_x, n_y = len(x), len(y)
+
+    less_than_x, greater_than_x = _dominance_counts(x, y)
+    less_than_y, greater_than_y = _dominance_counts(y, x)
+    greater = int(less_than_x.sum())
+    less = int(greater_than_x.sum())
+    delta = (greater - less) / (n_x * n_y)
+    if n_x < 2 or n_y < 2:
+        return delta, np.nan, np.nan
+
+    # Mean dominance of every x over all y, and of all x over every y
+    row_means = (less_than_x - greater_than_x) / n_y
+    col_means = (greater_than_y - less_than_y) / n_x
+    # Sum of squared deviations of the dominance matrix entries (each entry is -1, 0 or 1)
+    sum_squares = (greater + less) - n_x * n_y * delta ** 2
+    variance = (n_y ** 2 * np.sum((row_means - delta) ** 2)
+                + n_x ** 2 * np.sum((col_means - delta) ** 2)
+                - sum_squares) / (n_x * n_y * (n_x - 1) * (n_y - 1))
+    sd = np.sqrt(max(variance, 0.0))
+    if sd == 0:
+        # Complete separation (delta = ±1) or constant data: the interval collapses to the estimate
+        return delta, delta, delta
+
+    z = stats.norm.ppf(1 - (1 - confidence) / 2)
+    spread = z * sd * np.sqrt((1 - delta ** 2) ** 2 + z ** 2 * sd ** 2)
+    denominator = 1 - delta ** 2 + z ** 2 * sd ** 2
+    lower = (delta - delta ** 3 - spread) / denominator
+    upper = (delta - delta ** 3 + spread) / denominator
+    return delta, max(lower, -1.0), min(upper, 1.0)
+
+def cliffs_delta_matrix(groups, confidence=0.95, cache=None, hashes=None):
+    """
+    Computes Cliff's Delta with confidence intervals for all pairs of groups in one call.
+
+    Args:
+        groups (dict): Values of each variant, e.g. {"cuda-base": [...], ...}.
+        confidence (float): Confidence level of the intervals.
+        cache (ResultCache): Optional cache; each pair is then only recomputed when one of its inputs changed.
+        hashes (dict): Content hash of each variant's input, required with a cache.
+
+    Returns:
+        pd.DataFrame: One row per variant pair with Cliff's Delta and its confidence interval.
+    """
+    sorted_groups = {variant: np.sort(np.asarray(values)) for variant, values in groups.items()}
+    results = []
+    for var1, var2 in itertools.combinations(sorted_groups, 2):
+        if cache is None:
+            delta, lower, upper = cliffs_delta_ci(sorted_groups[var1], sorted_groups[var2], confidence)
+        else:
+            params = {"confidence": confidence, "variants": [var1, var2], "version": STEP_VERSIONS["cliffs_delta_ci"]}
+            delta, lower, upper = cache.compute("cliffs_delta_ci", params, [hashes[var1], hashes[var2]],
+                                                cliffs_delta_ci, sorted_groups[var1], sorted_groups[var2], confidence)
+        results.append({"Variant 1": var1, "Variant 2": var2, "Cliff's Delta": delta,
+                        "CI Lower": lower, "CI Upper": upper})
+    return pd.DataFrame(results)
+
 def analyze_pairwise_differences(data):
     """
     Computes Cliff's Delta and mean differences for all variant pairs.
@@ -245,17 +405,14 @@ def analyze_pairwise_differences(data):
         pd.DataFrame: Table with mean differences and Cliff's Delta for each variant pair.
     """
     results = []
-    variants = data["Variant"].unique()
+    groups, summary = build_variant_groups(data)
 
-    for var1, var2 in itertools.combinations(variants, 2):
-        group1 = data[data["Variant"] == var1]["Energy Consumption (Joules)"]
-        group2 = data[data["Variant"] == var2]["Energy Consumption (Joules)"]
-        
+    for var1, var2 in itertools.combinations(groups, 2):
         # Compute Mean Difference
-        mean_diff = group1.mean() - group2.mean()
+        mean_diff = summary.at[var1, "mean"] - summary.at[var2, "mean"]
 
         # Compute Cliff’s Delta
-        cliff_delta = cliffs_delta(group1, group2)
+        cliff_delta = cliffs_delta(groups[var1], groups[var2])
 
         # Store Results
         results.append({"Variant 1": var1, "Variant 2": var2, 
@@ -263,11 +420,87 @@ def analyze_pairwise_differences(data):
 
     return pd.DataFrame(results)
 
+def _compare_pair(pair):
+    """Computes the effect size and Mann-Whitney U p-value of one variant pair (runs in worker processes)."""
+    x, y = pair
+    _, p = stats.mannwhitneyu(x, y, alternative="two-sided")
+    return cliffs_delta(x, y), p
+
+def comparison_matrices(data, column=ENERGY_COLUMN, p_adjust="bonferroni", processes=None, executor=None):
+    """
+    Computes variant x variant matrices of mean difference, percent change, Cliff's Delta and
+    adjusted Mann-Whitney U p-values. Per-variant arrays and means are built once; pairs are
+    spread over a process pool when there are many variants.
+
+    Args:
+        data (pd.DataFrame): The dataset containing 'Variant' and the value column.
+        column (str): The column to compare.
+        p_adjust (str): Multiple-comparison correction passed to statsmodels' multipletests.
+        processes (int): Number of worker processes (default: one per CPU).
+        executor (Executor): Pool to spread the pairs over, reused across calls (overrides processes).
+
+    Returns:
+        dict: DataFrames "mean_difference", "percent_change", "cliffs_delta" and "p_value",
+        where the entry [row, column] compares the row variant to the column variant.
+    """
+    groups, summary = build_variant_groups(data, column)
+    variants = list(groups)
+    means = summary["mean"].reindex(variants).to_numpy()
+
+    mean_diff = means[:, None] - means[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Percent change from the row variant to the column variant
+        pct_change = np.where(means[:, None] != 0, (means[None, :] - means[:, None]) / means[:, None] * 100, np.nan)
+
+    pairs = list(itertools.combinations(range(len(variants)), 2))
+    pair_data = [(groups[variants[i]], groups[variants[j]]) for i, j in pairs]
+    chunksize = max(1, len(pairs) // 64)
+    if len(variants) >= PARALLEL_MIN_VARIANTS and executor is not None:
+        pair_results = list(executor.map(_compare_pair, pair_data, chunksize=chunksize))
+    elif len(variants) >= PARALLEL_MIN_VARIANTS:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            pair_results = list(pool.map(_compare_pair, pair_data, chunksize=chunksize))
+    else:
+        pair_results = [_compare_pair(pair) for pair in pair_data]
+
+    delta = np.zeros((len(variants), len(variants)))
+    p_values = np.ones((len(variants), len(variants)))
+    if pairs:
+        adjusted = multipletests([p for _, p in pair_results], method=p_adjust)[1]
+        for (i, j), (d, _), p in zip(pairs, pair_results, adjusted):
+            delta[i, j], delta[j, i] = d, -d
+            p_values[i, j] = p_values[j, i] = p
+
+    def frame(values):
+        return pd.DataFrame(values, index=variants, columns=variants)
+
+    return {
+        "mean_difference": frame(mean_diff),
+        "percent_change": frame(pct_change),
+        "cliffs_delta": frame(delta),
+        "p_value": frame(p_values),
+    }
+
 def main():
     """
     Main function to load data, generate plots, and compute statistical tests.
     """
-    csv_files = [
+    parser = argparse.ArgumentParser(description="Analyze the energy consumption of the image variants.")
+    parser.add_argument("csv_files", nargs="*", help="<variant>_output.csv files to analyze.")
+    parser.add_argument("--extract", metavar="FOLDER",
+                        help="Extract the runs of all logs under FOLDER (e.g. ../deployment) and analyze those.")
+    parser.add_argument("--db", nargs="?", const=DEFAULT_DB, metavar="DATABASE",
+                        help=f"Analyze runs queried from the results database (default: {DEFAULT_DB}).")
+    parser.add_argument("--variant", action="append", help="With --db: variant to include (repeatable).")
+    parser.add_argument("--campaign", action="append",
+                        help="With --db: campaign to include (repeatable; default: the latest one of each variant).")
+    parser.add_argument("--all-campaigns", action="store_true",
+                        help="With --db and without --campaign: include the runs of all campaigns.")
+    parser.add_argument("--since", help="With --db: only runs started at or after this ISO date.")
+    parser.add_argument("--until", help="With --db: only runs started before this ISO date.")
+    args = parser.parse_args()
+
+    csv_files = args.csv_files or [
         "cuda_idle_output.csv",
         "python_idle_output.csv",
         "pytorch_idle_output.csv",
@@ -275,24 +508,67 @@ def main():
         "ubuntu_idle_output.csv"
     ]
 
+    # Results are cached by the content hash of each input file
+    cache = ResultCache()
+    if args.extract:
+        csv_files = extract_all(args.extract, ".", cache)
+
     # Load and label data
-    combined_data, dataframes = load_and_label_data(csv_files)
+    if args.db:
+        try:
+            combined_data, dataframes, hashes = load_from_db(args.db, args.variant, args.campaign,
+                                                             parse_date(args.since), parse_date(args.until),
+                                                             args.all_campaigns)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        combined_data, dataframes, hashes = load_and_label_data(csv_files)
+    all_hashes = [hashes[variant] for variant in sorted(hashes)]
+
+    def step_params(step, **params):
+        # Results hold the variant labels, so a renamed variant with unchanged contents must not hit the cache
+        return {"variants": sorted(hashes), "version": STEP_VERSIONS[step], **params}
 
     # Generate violin plot for Energy Consumption (Joules)
     plot_violin_energy(combined_data)
 
     # Perform statistical tests
     print("Performing normality tests and significance statistics")
-    perform_statistical_test(combined_data)
+    cache.compute("perform_statistical_test", step_params("perform_statistical_test"), all_hashes, perform_statistical_test, combined_data)
 
     print("Summarize Data")
     summarize_data(combined_data)
 
     print("Perform pair-wise significance tests")
-    analyze_variants(combined_data)
+    cache.compute("analyze_variants", step_params("analyze_variants"), all_hashes, analyze_variants, combined_data)
 
     print("Compute Effect Size")
     print(analyze_pairwise_differences(combined_data))
+    groups, _ = build_variant_groups(combined_data)
+    print(cliffs_delta_matrix(groups, cache=cache, hashes=hashes))
+
+    # One worker pool for the whole run, shared by the steps that parallelize; workers only start on a cache miss
+    with ProcessPoolExecutor() as executor:
+        print("Bootstrap Confidence Intervals")
+        bootstrap_params = {"n_resamples": 10000, "chunk_size": 1000, "seed": 0}
+        distributions = {variant: cache.compute("bootstrap_distributions",
+                                                {**bootstrap_params, "variant": variant,
+                                                 "version": STEP_VERSIONS["bootstrap_distributions"]},
+                                                [hashes[variant]], bootstrap_distributions, {variant: values},
+                                                executor=executor, **bootstrap_params)[variant]
+                         for variant, values in groups.items()}
+        variant_ci, pair_ci = bootstrap_ci(groups, distributions=distributions)
+        print(variant_ci.to_string(float_format="%.2f"))
+        print(pair_ci.to_string(float_format="%.2f"))
+
+        print("Pairwise Comparison Matrices")
+        matrices = cache.compute("comparison_matrices", step_params("comparison_matrices"), all_hashes,
+                                 comparison_matrices, combined_data, executor=executor)
+    for name, matrix in matrices.items():
+        print(f"\n{name}:")
+        print(matrix.to_string(float_format="%.4f"))
+
+    print(f"\nAnalysis cache: {cache.hits} hits, {cache.misses} misses")
 
 if __name__ == "__main__":
     main()
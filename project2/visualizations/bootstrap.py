@@ -0,0 +1,118 @@
+import itertools
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def _resample_chunk(args):
+    """
+    Draws one chunk of bootstrap resamples of a variant. The resample indices are drawn as one
+    (resamples x n) matrix, so means and medians are computed without a Python loop.
+
+    Returns:
+        tuple: Means and medians of the resamples.
+    """
+    values, n_resamples, seed = args
+    rng = np.random.default_rng(seed)
+    samples = values[rng.integers(0, len(values), size=(n_resamples, len(values)))]
+    return samples.mean(axis=1), np.median(samples, axis=1)
+
+
+def variant_seed(seed, variant):
+    """Seed sequence of one variant, so its resamples do not depend on the other variants."""
+    return np.random.SeedSequence([seed, zlib.crc32(variant.encode())])
+
+
+def bootstrap_distributions(groups, n_resamples=10000, chunk_size=1000, processes=None, seed=0, executor=None):
+    """
+    Computes the bootstrap distributions of the mean and median of every variant.
+    Resamples are drawn in fixed-size chunks, each with its own seed spawned from `seed` and the
+    variant name, and the chunks are spread over a process pool. Results only depend on the seed,
+    the chunk size and the variant's own values, not on the number of processes or other variants.
+
+    Args:
+        groups (dict): Array of values for each variant.
+        n_resamples (int): Number of bootstrap resamples.
+        chunk_size (int): Number of resamples drawn per task.
+        processes (int): Number of worker processes (default: one per CPU, 1 runs in-process).
+        seed (int): Seed of the random generator.
+        executor (Executor): Pool to run the chunks on, reused across calls (overrides processes).
+
+    Returns:
+        dict: (means, medians) arrays of length n_resamples for each variant.
+    """
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    tasks = []
+    for variant, values in groups.items():
+        values = np.asarray(values, dtype=np.float64)
+        seeds = variant_seed(seed, variant).spawn(len(sizes))
+        tasks.extend((values, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds))
+
+    if executor is not None:
+        chunks = list(executor.map(_resample_chunk, tasks))
+    elif processes == 1 or len(tasks) == 1:
+        chunks = [_resample_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            chunks = list(executor.map(_resample_chunk, tasks))
+
+    distributions = {}
+    for i, variant in enumerate(groups):
+        variant_chunks = chunks[i * len(sizes):(i + 1) * len(sizes)]
+        distributions[variant] = (np.concatenate([means for means, _ in variant_chunks]),
+                                  np.concatenate([medians for _, medians in variant_chunks]))
+    return distributions
+
+
+def _interval(estimates, confidence):
+    alpha = (1 - confidence) / 2
+    return np.nanquantile(estimates, alpha), np.nanquantile(estimates, 1 - alpha)
+
+
+def bootstrap_ci(groups, n_resamples=10000, confidence=0.95, chunk_size=1000, processes=None, seed=0,
+                 distributions=None):
+    """
+    Computes percentile bootstrap confidence intervals for the mean and median of every variant,
+    and for the mean difference and percent change of every variant pair.
+
+    Args:
+        groups (dict): Array of values for each variant.
+        n_resamples (int): Number of bootstrap resamples.
+        confidence (float): Confidence level of the intervals.
+        chunk_size (int): Number of resamples drawn per task.
+        processes (int): Number of worker processes.
+        seed (int): Seed of the random generator.
+        distributions (dict): Precomputed output of bootstrap_distributions (e.g. from a cache).
+
+    Returns:
+        pd.DataFrame: Mean and median with confidence intervals per variant.
+        pd.DataFrame: Mean difference and percent change with confidence intervals per variant pair.
+    """
+    if distributions is None:
+        distributions = bootstrap_distributions(groups, n_resamples, chunk_size, processes, seed)
+
+    variant_rows = []
+    for variant, (means, medians) in distributions.items():
+        values = np.asarray(groups[variant], dtype=np.float64)
+        mean_low, mean_high = _interval(means, confidence)
+        median_low, median_high = _interval(medians, confidence)
+        variant_rows.append({"Variant": variant, "Mean": values.mean(), "Mean CI Lower": mean_low,
+                             "Mean CI Upper": mean_high, "Median": np.median(values),
+                             "Median CI Lower": median_low, "Median CI Upper": median_high})
+
+    pair_rows = []
+    for var1, var2 in itertools.combinations(distributions, 2):
+        means1, means2 = distributions[var1][0], distributions[var2][0]
+        mean1, mean2 = np.mean(groups[var1]), np.mean(groups[var2])
+        diff_low, diff_high = _interval(means1 - means2, confidence)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_low, change_high = _interval((means2 - means1) / means1 * 100, confidence)
+        pair_rows.append({"Variant 1": var1, "Variant 2": var2,
+                          "Mean Difference": mean1 - mean2, "Difference CI Lower": diff_low,
+                          "Difference CI Upper": diff_high,
+                          "Percent Change": (mean2 - mean1) / mean1 * 100 if mean1 != 0 else np.nan,
+                          "Change CI Lower": change_low, "Change CI Upper": change_high})
+
+    return pd.DataFrame(variant_rows), pd.DataFrame(pair_rows)
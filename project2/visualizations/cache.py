@@ -0,0 +1,100 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+from contextlib import redirect_stdout
+
+DEFAULT_CACHE_DIR = ".analysis_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of analysis results, keyed by the name of the step, its parameters and the
+    content hashes of its inputs. Anything a step prints is stored with its result and replayed on a hit.
+    When the cache grows beyond max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, step, params, input_hashes):
+        key = json.dumps([step, params, list(input_hashes)], sort_keys=True, default=str)
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".pkl")
+
+    def lookup(self, step, params, input_hashes):
+        """Returns (True, (result, output)) for a cached entry, (False, None) otherwise. Does not replay output."""
+        path = self._path(step, params, input_hashes)
+        try:
+            with open(path, "rb") as f:
+                result, output = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception:
+            # A corrupt entry, or one pickled by older code (e.g. AttributeError, ImportError): recompute it
+            return False, None
+        os.utime(path)  # Mark as recently used
+        return True, (result, output)
+
+    def store(self, step, params, input_hashes, result, output=""):
+        path = self._path(step, params, input_hashes)
+        # Write to a temporary file first, so an interrupted run never leaves a truncated entry
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((result, output), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        self.evict()
+
+    def compute(self, step, params, input_hashes, fn, *args, **kwargs):
+        """
+        Returns the cached result of fn(*args, **kwargs) for this step, parameters and inputs,
+        or runs fn and stores its result.
+
+        Args:
+            step (str): Name of the analysis step.
+            params: JSON-serializable parameters that influence the result.
+            input_hashes (list of str): Content hashes of the inputs.
+            fn (callable): Function computing the result.
+        """
+        hit, entry = self.lookup(step, params, input_hashes)
+        if hit:
+            self.hits += 1
+            result, output = entry
+            print(output, end="")
+            return result
+
+        self.misses += 1
+        buffer = io.StringIO()
+        with redirect_stdout(buffer):
+            result = fn(*args, **kwargs)
+        output = buffer.getvalue()
+        print(output, end="")
+        self.store(step, params, input_hashes, result, output)
+        return result
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
@@ -0,0 +1,165 @@
+import argparse
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# The RAPL counters reported by energibridge wrap around at 2^32 energy units of 61 uJ
+ENERGY_COUNTER_RANGE = 262144.0
+
+ENERGY_COLUMNS = ["PACKAGE_ENERGY (J)", "DRAM_ENERGY (J)", "PP0_ENERGY (J)", "PP1_ENERGY (J)"]
+INT_COLUMNS = ["TOTAL_MEMORY", "TOTAL_SWAP", "USED_MEMORY", "USED_SWAP", "GPU0_MEMORY_TOTAL", "GPU0_MEMORY_USED"]
+# Shorter intervals (at the start of a run) are dominated by counter update granularity
+MIN_INTERVAL_MS = 100
+RUN_FILE_PATTERN = re.compile(r"energy_results_.+_(\d+)\.csv$")
+
+
+def column_name(source):
+    """
+    Converts an energibridge column name to a column file name, e.g. "PACKAGE_ENERGY (J)" -> "package_power"
+    (energy counters are stored as power) and "GPU0_POWER (mWatts)" -> "gpu0_power".
+    """
+    name = source.split(" (")[0].lower()
+    if source in ENERGY_COLUMNS:
+        name = name.replace("_energy", "_power")
+    return name
+
+
+def sample_intervals(time_ms):
+    """
+    Returns the interval (ms) ending at each sample. The "Time" column is used rather than "Delta",
+    which is shifted by one row in the energibridge output (the last row of a run has a Delta of a few ms).
+    """
+    return np.diff(time_ms, prepend=time_ms[0])
+
+
+def counter_power(energy, interval_ms):
+    """
+    Converts a cumulative energy counter (J) to the average power (W) over each sample interval.
+    Negative steps are counter wraparounds. Samples without a usable interval (the first ones of a run) get NaN.
+    """
+    steps = np.diff(energy, prepend=energy[0])
+    steps[steps < 0] += ENERGY_COUNTER_RANGE
+    with np.errstate(divide="ignore", invalid="ignore"):
+        power = steps / (interval_ms / 1000)
+    power[interval_ms < MIN_INTERVAL_MS] = np.nan
+    return power.astype(np.float32)
+
+
+def find_run_files(deployment_dir):
+    """Returns (variant, run, path) for every per-run energibridge CSV, ordered by variant and run."""
+    run_files = []
+    for path in glob.glob(os.path.join(deployment_dir, "*", "results", "energy_results_*.csv")):
+        match = RUN_FILE_PATTERN.search(os.path.basename(path))
+        if match:
+            variant = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            run_files.append((variant, int(match.group(1)), path))
+    return sorted(run_files)
+
+
+def ingest(deployment_dir, output_dir):
+    """
+    Converts all per-run energibridge CSVs under deployment_dir into one columnar dataset in output_dir:
+    one .npy file per column, a runs.npy index of (variant, run, first row, end row) and metadata.json.
+    """
+    run_files = find_run_files(deployment_dir)
+    if not run_files:
+        raise FileNotFoundError(f"No energibridge results found under {deployment_dir}")
+    variants = sorted({variant for variant, _, _ in run_files})
+
+    frames = []
+    index = []
+    row = 0
+    for variant, run, path in run_files:
+        df = pd.read_csv(path)
+        time_ms = df["Time"].to_numpy(dtype=np.int64)
+        interval_ms = sample_intervals(time_ms)
+        columns = {
+            "variant": np.full(len(df), variants.index(variant), dtype=np.int16),
+            "run": np.full(len(df), run, dtype=np.int16),
+            "time": time_ms,
+            "interval": interval_ms.astype(np.int32),
+        }
+        for source in df.columns:
+            if source in ("Delta", "Time"):
+                continue
+            if source in ENERGY_COLUMNS:
+                columns[column_name(source)] = counter_power(df[source].to_numpy(dtype=np.float64), interval_ms)
+            elif source in INT_COLUMNS:
+                columns[column_name(source)] = df[source].to_numpy(dtype=np.int64)
+            else:
+                columns[column_name(source)] = df[source].to_numpy(dtype=np.float32)
+        if "gpu0_power" in columns:
+            columns["gpu0_power"] = columns["gpu0_power"] / np.float32(1000)  # mW to W
+        frames.append(columns)
+        index.append((variants.index(variant), run, row, row + len(df)))
+        row += len(df)
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Runs without a column (e.g. no GPU) are padded with NaN / -1
+    names = sorted({name for columns in frames for name in columns})
+    dtypes = {}
+    for name in names:
+        dtype = next(columns[name].dtype for columns in frames if name in columns)
+        fill = -1 if np.issubdtype(dtype, np.integer) else np.nan
+        parts = [columns.get(name, np.full(len(columns["run"]), fill, dtype=dtype)) for columns in frames]
+        np.save(os.path.join(output_dir, f"{name}.npy"), np.concatenate(parts))
+        dtypes[name] = str(dtype)
+    np.save(os.path.join(output_dir, "runs.npy"), np.array(index, dtype=np.int64))
+
+    with open(os.path.join(output_dir, "metadata.json"), "w") as f:
+        json.dump({"variants": variants, "columns": dtypes, "rows": row}, f, indent=2)
+    print(f"Ingested {len(run_files)} runs of {len(variants)} variants ({row} samples) into {output_dir}")
+
+
+class ColumnarDataset:
+    """Memory-mapped view of a dataset written by ingest(). Columns are only read when accessed."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "metadata.json")) as f:
+            metadata = json.load(f)
+        self.variants = metadata["variants"]
+        self.columns = list(metadata["columns"])
+        self.runs = np.load(os.path.join(path, "runs.npy"))
+        self._cache = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self.columns:
+                raise KeyError(name)
+            self._cache[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._cache[name]
+
+    def run_slice(self, variant, run):
+        """Returns the row slice holding one run of a variant."""
+        code = self.variants.index(variant)
+        for v, r, start, end in self.runs:
+            if v == code and r == run:
+                return slice(int(start), int(end))
+        raise KeyError(f"No run {run} for variant {variant}")
+
+    def variant_runs(self, variant):
+        """Returns the run numbers recorded for a variant."""
+        code = self.variants.index(variant)
+        return [int(r) for v, r, _, _ in self.runs if v == code]
+
+    def get_run(self, variant, run, columns):
+        """Returns a dict of column arrays for one run."""
+        rows = self.run_slice(variant, run)
+        return {name: self[name][rows] for name in columns}
+
+
+def load_dataset(path):
+    return ColumnarDataset(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the per-run energibridge CSVs into a columnar dataset.")
+    parser.add_argument("--deployment", default="../deployment", help="Directory holding the image result folders.")
+    parser.add_argument("--output", default="../deployment/columnar", help="Output directory of the dataset.")
+    args = parser.parse_args()
+    ingest(args.deployment, args.output)
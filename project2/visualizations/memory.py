@@ -0,0 +1,80 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar import find_run_files
+from phases import cumulative_energy, read_markers
+
+MIB = 2 ** 20
+# energibridge reports host memory and swap in bytes, GPU memory in MiB
+MEMORY_COLUMNS = {"Memory": ("USED_MEMORY", MIB), "Swap": ("USED_SWAP", MIB), "GPU Memory": ("GPU0_MEMORY_USED", 1)}
+
+
+def run_memory(samples):
+    """
+    Returns the memory used by one run on top of the host's baseline: the first sample of the run,
+    taken before the container starts. Also returns the run's package energy so both can be reported side by side.
+    """
+    result = {"Duration (s)": (samples["Time"].iloc[-1] - samples["Time"].iloc[0]) / 1000}
+    for name, (column, unit) in MEMORY_COLUMNS.items():
+        if column not in samples:
+            continue
+        used = samples[column].to_numpy(dtype=np.float64) / unit
+        used -= used[0]
+        result[f"Peak {name} (MiB)"] = used.max()
+        result[f"Mean {name} (MiB)"] = used.mean()
+    if "PACKAGE_ENERGY (J)" in samples:
+        result["Package Energy (J)"] = cumulative_energy(samples["PACKAGE_ENERGY (J)"].to_numpy(dtype=np.float64))[-1]
+    return result
+
+
+def memory_profile(deployment_dir):
+    """
+    Computes the baseline-subtracted memory of every run from the energibridge CSVs. When the benchmark printed
+    phase markers, the peak RSS and allocator high-water mark it measured itself during the run are added.
+    """
+    rows = []
+    markers = {}
+    for variant, run, path in find_run_files(deployment_dir):
+        if variant not in markers:
+            log_file = os.path.join(deployment_dir, variant, f"energy_logs_{variant}.txt")
+            markers[variant] = read_markers(log_file) if os.path.exists(log_file) else []
+        samples = pd.read_csv(path)
+        row = {"Variant": variant, "Run": run, **run_memory(samples)}
+
+        start, end = samples["Time"].iloc[0] / 1000, samples["Time"].iloc[-1] / 1000
+        run_markers = [marker for marker in markers[variant] if start <= marker["start"] and marker["end"] <= end]
+        for key, column in (("peak_rss", "Benchmark Peak RSS (MiB)"), ("peak_allocated", "Benchmark Peak Allocated (MiB)")):
+            values = [marker[key] for marker in run_markers if marker.get(key) is not None]
+            if values:
+                row[column] = max(values) / MIB
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def summarize_memory(profile):
+    """Per variant: mean and maximum over runs of every peak, and the mean of the other columns (e.g. energy)."""
+    columns = [column for column in profile.columns if column not in ("Variant", "Run")]
+    aggregations = {column: ["mean", "max"] if column.startswith(("Peak", "Benchmark Peak")) else ["mean"]
+                    for column in columns}
+    summary = profile.groupby("Variant").agg(aggregations)
+    summary.columns = [f"Max {column}" if statistic == "max" else column for column, statistic in summary.columns]
+    summary.insert(0, "Runs", profile.groupby("Variant").size())
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory profile of every run and image variant.")
+    parser.add_argument("--deployment", default="../deployment", help="Directory holding the image result folders.")
+    parser.add_argument("--output", default="memory_profile.csv", help="Output CSV with one row per run.")
+    parser.add_argument("--summary", default="memory_summary.csv", help="Output CSV with one row per variant.")
+    args = parser.parse_args()
+
+    profile = memory_profile(args.deployment)
+    profile.to_csv(args.output, index=False)
+    summary = summarize_memory(profile)
+    summary.to_csv(args.summary)
+    print(summary.round(1).to_string())
+    print(f"Memory profile saved to {args.output} and {args.summary}")
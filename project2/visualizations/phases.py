@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar import ENERGY_COUNTER_RANGE, find_run_files
+
+PHASE_MARKER = "PHASE "
+PHASE_COUNTERS = {"package": "PACKAGE_ENERGY (J)", "dram": "DRAM_ENERGY (J)"}
+
+
+def read_markers(log_file):
+    """
+    Returns the markers printed by benchmark.py in a log: dicts with the phase name, its start and end
+    (epoch seconds) and, when recorded, its peak RSS and allocator high-water mark (bytes).
+    """
+    markers = []
+    with open(log_file, errors="replace") as f:
+        for line in f:
+            if line.startswith(PHASE_MARKER):
+                try:
+                    marker = json.loads(line[len(PHASE_MARKER):])
+                except json.JSONDecodeError:
+                    continue  # Interleaved with other output
+                markers.append(marker)
+    return markers
+
+
+def cumulative_energy(energy):
+    """Turns an energibridge counter into the energy (J) used since the first sample, undoing wraparounds."""
+    steps = np.diff(energy, prepend=energy[0])
+    steps[steps < 0] += ENERGY_COUNTER_RANGE
+    return np.cumsum(steps)
+
+
+def align_phases(samples, markers):
+    """
+    Attributes energy to phases by interpolating the cumulative energy counters of one run at the phase
+    boundaries. Markers outside the run's samples are ignored; phases that only partly overlap get NaN.
+
+    Args:
+        samples (pd.DataFrame): Per-run energibridge CSV (Time in epoch ms, cumulative energy counters).
+        markers (list): Marker dicts from read_markers.
+
+    Returns:
+        pd.DataFrame: Duration, energy (J), average power (W) and peak memory (MiB) of every phase in the run.
+    """
+    times = samples["Time"].to_numpy(dtype=np.float64) / 1000
+    counters = {name: cumulative_energy(samples[column].to_numpy(dtype=np.float64))
+                for name, column in PHASE_COUNTERS.items() if column in samples}
+    # Rows with a repeated timestamp (the first rows of a run) would make the interpolation ambiguous
+    keep = np.append(np.diff(times) > 0, True)
+    times = times[keep]
+    counters = {name: values[keep] for name, values in counters.items()}
+
+    rows = []
+    for marker in markers:
+        start, end = marker["start"], marker["end"]
+        if end < times[0] or start > times[-1]:
+            continue
+        covered = start >= times[0] and end <= times[-1]
+        row = {"Phase": marker["phase"], "Start": start, "Duration (s)": end - start}
+        for counter, values in counters.items():
+            energy = np.interp(end, times, values) - np.interp(start, times, values) if covered else np.nan
+            row[f"{counter.capitalize()} Energy (J)"] = energy
+            row[f"{counter.capitalize()} Power (W)"] = energy / (end - start) if end > start else np.nan
+        for key, column in (("peak_rss", "Peak RSS (MiB)"), ("peak_allocated", "Peak Allocated (MiB)")):
+            if marker.get(key) is not None:
+                row[column] = marker[key] / 2**20
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def phase_energy(deployment_dir):
+    """Aligns the phase markers in every variant's log with its per-run energibridge CSVs."""
+    frames = []
+    markers = {}
+    for variant, run, path in find_run_files(deployment_dir):
+        if variant not in markers:
+            log_file = os.path.join(deployment_dir, variant, f"energy_logs_{variant}.txt")
+            markers[variant] = read_markers(log_file) if os.path.exists(log_file) else []
+        if not markers[variant]:
+            continue
+        phases = align_phases(pd.read_csv(path), markers[variant])
+        phases.insert(0, "Run", run)
+        phases.insert(0, "Variant", variant)
+        frames.append(phases)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Energy per benchmark phase from the phase markers and energibridge samples.")
+    parser.add_argument("--deployment", default="../deployment", help="Directory holding the image result folders.")
+    parser.add_argument("--output", default="phase_energy.csv", help="Output CSV with one row per run and phase.")
+    args = parser.parse_args()
+
+    phases = phase_energy(args.deployment)
+    if phases.empty:
+        print("No phase markers found (logs from before the benchmark printed them cannot be split).")
+    else:
+        phases.to_csv(args.output, index=False)
+        summary = phases.groupby(["Variant", "Phase"], sort=False)[
+            [column for column in phases.columns if column.endswith(("(J)", "(W)", "(MiB)"))] + ["Duration (s)"]].mean()
+        print(summary.round(2).to_string())
+        print(f"Phase energy saved to {args.output}")
@@ -1,25 +1,40 @@
-import re
+import argparse
 import csv
+import glob
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import ResultCache, file_hash
 
 # Define the regex pattern
-pattern = r"Energy consumption in joules: ([\d\.]+) for ([\d\.]+) sec of execution."
+pattern = rb"Energy consumption in joules: ([\d\.]+) for ([\d\.]+) sec of execution."
+PATTERN = re.compile(pattern)
+# Cheap byte-level prefilter: the regex is only applied where this prefix occurs
+PREFIX = b"Energy consumption in joules: "
 
-# Function to extract data from a text file and save to CSV
-def extract_energy_data(input_file, output_file):
+# Function to extract the (run, energy, time) rows from a text file
+def read_energy_data(input_file):
     extracted_data = []
+    if os.path.getsize(input_file) == 0:
+        return extracted_data
 
-    # Read the text file
-    with open(input_file, "r", encoding="utf-8") as file:
+    # Memory-map the log and jump from one candidate line to the next instead of scanning every line
+    with open(input_file, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
         run = 1
-        for line in file:
-            match = re.search(pattern, line)
+        position = data.find(PREFIX)
+        while position != -1:
+            match = PATTERN.match(data, position)
             if match:
                 energy = float(match.group(1))  # Extract energy consumption
                 time = float(match.group(2))    # Extract execution time
                 extracted_data.append([run, energy, time])
                 run += 1
+            position = data.find(PREFIX, position + len(PREFIX))
+    return extracted_data
 
-    # Write to CSV
+def write_energy_data(extracted_data, output_file):
     with open(output_file, "w", newline="") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Run", "Energy Consumption (Joules)", "Execution Time (Seconds)"])  # Header
@@ -27,11 +42,66 @@ def extract_energy_data(input_file, output_file):
 
     print(f"Extraction complete. Data saved to {output_file}")
 
+# Function to extract data from a text file and save to CSV; logs are only re-read when their content changed
+def extract_energy_data(input_file, output_file, cache=None):
+    if cache is None:
+        extracted_data = read_energy_data(input_file)
+    else:
+        extracted_data = cache.compute("read_energy_data", pattern.decode(), [file_hash(input_file)],
+                                       read_energy_data, input_file)
+    write_energy_data(extracted_data, output_file)
+
+def find_logs(folder):
+    """Returns (variant, log file) for every deployment directory, the variant being the directory name."""
+    logs = []
+    for path in sorted(glob.glob(os.path.join(folder, "*", "energy_logs_*.txt"))):
+        logs.append((os.path.basename(os.path.dirname(path)), path))
+    return logs
+
+def extract_all(folder, output_dir, cache=None, processes=None):
+    """
+    Extracts the runs of every log under folder into <variant>_output.csv files in output_dir.
+    Logs that are not cached are processed in parallel, one per worker process.
+
+    Returns:
+        list of str: The written CSV files, ready to be passed to analyze.py.
+    """
+    logs = find_logs(folder)
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    pending = []
+    for variant, path in logs:
+        digest = None
+        if cache is not None:
+            digest = file_hash(path)
+            hit, entry = cache.lookup("read_energy_data", pattern.decode(), [digest])
+            if hit:
+                results[variant] = entry[0]
+                continue
+        pending.append((variant, path, digest))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            extracted = executor.map(read_energy_data, [path for _, path, _ in pending])
+            for (variant, path, digest), extracted_data in zip(pending, extracted):
+                results[variant] = extracted_data
+                if cache is not None:
+                    cache.store("read_energy_data", pattern.decode(), [digest], extracted_data)
+
+    output_files = []
+    for variant, _ in logs:
+        output_file = os.path.join(output_dir, f"{variant}_output.csv")
+        write_energy_data(results[variant], output_file)
+        output_files.append(output_file)
+    return output_files
+
 
-files = ['cuda_idle/energy_logs_cuda.txt', 'python_idle/energy_logs_python.txt', 'pytorch_idle/energy_logs_pytorch.txt', 'ubuntu_idle/energy_logs_ubuntu.txt', 
-         'nvcr_idle/energy_logs_nvcr.txt']
-folder = '../deployment/'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the energibridge summaries of all deployment logs.")
+    parser.add_argument("--folder", default="../deployment/", help="Directory holding one folder per image.")
+    parser.add_argument("--output", default=".", help="Directory the <variant>_output.csv files are written to.")
+    parser.add_argument("-j", "--processes", type=int, help="Number of worker processes (default: one per CPU).")
+    args = parser.parse_args()
 
-for file in files:
-    first_path = file.split('/')[0]
-    extract_energy_data(f"{folder}{file}", f"{first_path}_output.csv")
+    extract_all(args.folder, args.output, ResultCache(), args.processes)
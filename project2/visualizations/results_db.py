@@ -0,0 +1,303 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DB = "../deployment/results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT,
+    started_at REAL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS variants (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    campaign_id INTEGER NOT NULL REFERENCES campaigns(id),
+    variant_id INTEGER NOT NULL REFERENCES variants(id),
+    run INTEGER NOT NULL,
+    started_at REAL,
+    status TEXT NOT NULL DEFAULT 'done',
+    UNIQUE (campaign_id, variant_id, run)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    energy REAL,
+    duration REAL,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    time REAL NOT NULL,
+    package_energy REAL,
+    dram_energy REAL,
+    gpu_power REAL,
+    used_memory INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_variant ON runs (variant_id, run);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+CREATE INDEX IF NOT EXISTS campaigns_started ON campaigns (started_at);
+CREATE INDEX IF NOT EXISTS samples_run_time ON samples (run_id, time);
+"""
+
+# energibridge columns stored per sample, with the time in epoch seconds
+SAMPLE_COLUMNS = {"package_energy": "PACKAGE_ENERGY (J)", "dram_energy": "DRAM_ENERGY (J)",
+                  "gpu_power": "GPU0_POWER (mWatts)", "used_memory": "USED_MEMORY"}
+RESULTS_NAME_PATTERN = re.compile(r"(\d{8}_\d{6})")
+# The same image appears as e.g. "ubuntu" (deployment directories, measure_linux.py) and "ubuntu-base" (summary CSVs)
+VARIANT_SUFFIX = re.compile(r"-base$")
+
+
+def normalize_variant(name):
+    """Canonical name of a variant, so every importer and query uses the same one (e.g. ubuntu-base -> ubuntu)."""
+    return VARIANT_SUFFIX.sub("", name)
+
+
+def parse_date(value):
+    """Epoch seconds of an ISO date or date-time (e.g. 2025-03-01 or 2025-03-01T12:00), or None."""
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+class ResultsDB:
+    """
+    SQLite store of all measurement campaigns: campaigns, variants, runs with their summary (energy and duration)
+    and, optionally, the energibridge samples of each run. Every insert of a run or a batch of runs is one transaction.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        self._variants = {}
+
+    def campaign(self, name, source=None, started_at=None, metadata=None):
+        """Returns the id of the campaign with this name, creating it if needed."""
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO campaigns (name, source, started_at, metadata) VALUES (?, ?, ?, ?)",
+                              (name, source, started_at, json.dumps(metadata) if metadata else None))
+        return self.conn.execute("SELECT id FROM campaigns WHERE name = ?", (name,)).fetchone()[0]
+
+    def variant(self, name):
+        name = normalize_variant(name)
+        if name not in self._variants:
+            self.conn.execute("INSERT OR IGNORE INTO variants (name) VALUES (?)", (name,))
+            self._variants[name] = self.conn.execute("SELECT id FROM variants WHERE name = ?", (name,)).fetchone()[0]
+        return self._variants[name]
+
+    def _insert_run(self, campaign_id, record):
+        variant_id = self.variant(record["variant"])
+        # Re-measured runs (e.g. a failed run after --resume) replace the earlier attempt
+        self.conn.execute("DELETE FROM runs WHERE campaign_id = ? AND variant_id = ? AND run = ?",
+                          (campaign_id, variant_id, record["run"]))
+        run_id = self.conn.execute(
+            "INSERT INTO runs (campaign_id, variant_id, run, started_at, status) VALUES (?, ?, ?, ?, ?)",
+            (campaign_id, variant_id, record["run"], record.get("started_at"), record.get("status", "done"))).lastrowid
+        self.conn.execute("INSERT INTO summaries (run_id, energy, duration, extra) VALUES (?, ?, ?, ?)",
+                          (run_id, record.get("energy"), record.get("duration"),
+                           json.dumps(record["extra"]) if record.get("extra") else None))
+        samples = record.get("samples")
+        if samples is not None and len(samples):
+            self.conn.executemany(f"INSERT INTO samples (run_id, time, {', '.join(SAMPLE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                                  ((run_id, *row) for row in samples))
+        return run_id
+
+    def add_runs(self, campaign_id, records):
+        """
+        Inserts run records in a single transaction. A record is a dict with variant, run and optionally
+        started_at (epoch seconds), status, energy (J), duration (s), extra (JSON-serializable) and samples
+        (rows of time and the SAMPLE_COLUMNS values, e.g. from energibridge_samples).
+        """
+        try:
+            with self.conn:
+                return [self._insert_run(campaign_id, record) for record in records]
+        except sqlite3.Error:
+            self._variants = {}  # Variants inserted by the rolled back transaction
+            raise
+
+    def add_run(self, campaign_id, record):
+        return self.add_runs(campaign_id, [record])[0]
+
+    def query_runs(self, variants=None, campaigns=None, since=None, until=None, status="done", all_campaigns=False):
+        """
+        Returns the runs matching the filters as a DataFrame with the columns of the extracted *_output.csv files
+        (Run, Energy Consumption (Joules), Execution Time (Seconds)) plus Variant, Campaign and Started.
+        Runs without their own start time are filtered on the start time of their campaign.
+        Variant names are normalized, so "ubuntu" and "ubuntu-base" select the same runs.
+        The same runs are often imported more than once (e.g. from a summary CSV and from the per-run CSVs), so
+        without campaigns only the most recently started matching campaign of each variant is returned, unless
+        all_campaigns is set.
+        """
+        conditions, params = ["runs.status = ?"], [status]
+        if variants:
+            conditions.append(f"variants.name IN ({', '.join('?' * len(variants))})")
+            params.extend(normalize_variant(variant) for variant in variants)
+        if campaigns:
+            conditions.append(f"campaigns.name IN ({', '.join('?' * len(campaigns))})")
+            params.extend(campaigns)
+        started = "COALESCE(runs.started_at, campaigns.started_at)"
+        if since is not None:
+            conditions.append(f"{started} >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append(f"{started} < ?")
+            params.append(until)
+        query = f"""
+            SELECT runs.run AS "Run", summaries.energy AS "Energy Consumption (Joules)",
+                   summaries.duration AS "Execution Time (Seconds)", variants.name AS "Variant",
+                   campaigns.name AS "Campaign", {started} AS "Started"
+            FROM runs
+            JOIN variants ON variants.id = runs.variant_id
+            JOIN campaigns ON campaigns.id = runs.campaign_id
+            JOIN summaries ON summaries.run_id = runs.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY variants.id, campaigns.id, runs.run"""
+        runs = pd.read_sql_query(query, self.conn, params=params)
+        if campaigns or all_campaigns or runs.empty:
+            return runs
+        # Campaigns without any start time count as the oldest; ties go to the one added last
+        latest = runs.sort_values("Started", kind="stable", na_position="first").groupby("Variant")["Campaign"].last()
+        return runs[runs["Campaign"] == runs["Variant"].map(latest)].reset_index(drop=True)
+
+    def samples(self, run_id):
+        return pd.read_sql_query("SELECT * FROM samples WHERE run_id = ? ORDER BY time", self.conn, params=(run_id,))
+
+    def close(self):
+        self.conn.close()
+
+
+def energibridge_samples(samples):
+    """Rows of (time in epoch seconds, *SAMPLE_COLUMNS) from a per-run energibridge DataFrame; missing columns are NULL."""
+    columns = [samples["Time"].to_numpy(dtype=np.float64) / 1000]
+    for source in SAMPLE_COLUMNS.values():
+        columns.append(samples[source].to_numpy() if source in samples else np.full(len(samples), None))
+    return [tuple(v.item() if hasattr(v, "item") else v for v in row) for row in zip(*columns)]
+
+
+def run_start(run_file):
+    """Start (epoch seconds) of a run from the first Time sample of its energibridge CSV, or None when it is missing."""
+    if not os.path.exists(run_file):
+        return None
+    times = pd.read_csv(run_file, usecols=["Time"], nrows=1)["Time"]
+    return times.iloc[0] / 1000 if len(times) else None
+
+
+def import_summaries(db, csv_file, variant, campaign=None, started_at=None):
+    """
+    Imports a three-column summary CSV (run, energy, time): a *_output.csv written by process_results.py
+    or an energy_measurements_*.csv written by measure_linux.py. Runs are stored numbered from 0, like the per-run
+    energibridge CSVs (*_output.csv files number them from 1). The start of a run is read from its energibridge CSV
+    next to an energy_measurements_*.csv; the log behind an *_output.csv has no times, so those runs only have
+    the campaign start when it is given.
+    """
+    df = pd.read_csv(csv_file)
+    run, energy, duration = df.columns[:3]
+    first_run = 1 if energy == "Energy Consumption (Joules)" else 0
+    name = os.path.basename(csv_file)[:-len(".csv")]
+    run_files = None
+    if name.startswith("energy_measurements_"):
+        run_files = os.path.join(os.path.dirname(os.path.abspath(csv_file)), "results",
+                                 f"energy_results_{name[len('energy_measurements_'):]}_{{}}.csv")
+    campaign_id = db.campaign(campaign or os.path.abspath(csv_file), "summary-csv", started_at)
+    return len(db.add_runs(campaign_id, [
+        {"variant": variant, "run": int(row[run]) - first_run, "energy": float(row[energy]),
+         "duration": float(row[duration]),
+         "started_at": run_start(run_files.format(int(row[run]))) if run_files else None}
+        for _, row in df.iterrows()]))
+
+
+def import_energibridge_runs(db, deployment_dir, campaign=None, with_samples=False):
+    """
+    Imports every per-run energibridge CSV under deployment_dir: the run's start time, its package energy
+    (from the cumulative counter) and duration, and optionally all its samples.
+    """
+    from columnar import find_run_files
+    from phases import cumulative_energy
+
+    campaign_id = db.campaign(campaign or os.path.abspath(deployment_dir), "energibridge-csv")
+    records = []
+    for variant, run, path in find_run_files(deployment_dir):
+        samples = pd.read_csv(path)
+        time_ms = samples["Time"].to_numpy(dtype=np.int64)
+        records.append({"variant": variant, "run": run, "started_at": time_ms[0] / 1000,
+                        "energy": cumulative_energy(samples["PACKAGE_ENERGY (J)"].to_numpy(dtype=np.float64))[-1],
+                        "duration": (time_ms[-1] - time_ms[0]) / 1000,
+                        "samples": energibridge_samples(samples) if with_samples else None})
+    return len(db.add_runs(campaign_id, records))
+
+
+def import_power_metrics(db, results_file, variant, campaign=None):
+    """
+    Imports a results_<YYYYmmdd_HHMMSS>.out file of power_metrics.py (one total energy per line);
+    the campaign starts at the time in the file name.
+    """
+    match = RESULTS_NAME_PATTERN.search(os.path.basename(results_file))
+    started_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp() if match else None
+    with open(results_file) as f:
+        values = [float(line) for line in f if line.strip()]
+    campaign_id = db.campaign(campaign or os.path.abspath(results_file), "power_metrics", started_at)
+    return len(db.add_runs(campaign_id, [{"variant": variant, "run": run, "energy": energy}
+                                         for run, energy in enumerate(values)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import existing results into the results database, or query it.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summaries = subparsers.add_parser("import-summaries", help="Import <variant>_output.csv or energy_measurements CSVs.")
+    summaries.add_argument("files", nargs="+")
+    summaries.add_argument("--variant", help="Variant name (default: derived from each file name).")
+    summaries.add_argument("--campaign", help="Campaign name (default: the file path).")
+    summaries.add_argument("--started", help="ISO start time of the campaign, for runs whose own start is unknown.")
+
+    runs = subparsers.add_parser("import-runs", help="Import the per-run energibridge CSVs of a deployment directory.")
+    runs.add_argument("deployment", nargs="?", default="../deployment")
+    runs.add_argument("--campaign", help="Campaign name (default: the directory path).")
+    runs.add_argument("--samples", action="store_true", help="Also store every energibridge sample.")
+
+    power = subparsers.add_parser("import-power-metrics", help="Import results_*.out files of power_metrics.py.")
+    power.add_argument("files", nargs="+")
+    power.add_argument("--variant", required=True, help="Variant (framework) the results belong to.")
+
+    query = subparsers.add_parser("query", help="Print the runs matching the filters.")
+    query.add_argument("--variant", action="append", help="Variant to include (repeatable).")
+    query.add_argument("--campaign", action="append", help="Campaign to include (repeatable).")
+    query.add_argument("--since", help="Only runs started at or after this ISO date.")
+    query.add_argument("--until", help="Only runs started before this ISO date.")
+    query.add_argument("--all-campaigns", action="store_true",
+                       help="Without --campaign: runs of all campaigns instead of the latest one of each variant.")
+    args = parser.parse_args()
+
+    db = ResultsDB(args.db)
+    if args.command == "import-summaries":
+        for file in args.files:
+            variant = args.variant or re.sub(r"^energy_measurements_|_output$", "", os.path.basename(file)[:-len(".csv")])
+            count = import_summaries(db, file, variant, args.campaign, parse_date(args.started))
+            print(f"Imported {count} runs of {normalize_variant(variant)} from {file}")
+    elif args.command == "import-runs":
+        print(f"Imported {import_energibridge_runs(db, args.deployment, args.campaign, args.samples)} runs "
+              f"from {args.deployment}")
+    elif args.command == "import-power-metrics":
+        for pattern in args.files:
+            for file in sorted(glob.glob(pattern)):
+                print(f"Imported {import_power_metrics(db, file, args.variant)} runs from {file}")
+    else:
+        runs = db.query_runs(args.variant, args.campaign, parse_date(args.since), parse_date(args.until),
+                             all_campaigns=args.all_campaigns)
+        runs["Started"] = pd.to_datetime(runs["Started"], unit="s")
+        print(runs.to_string(index=False))
+    db.close()
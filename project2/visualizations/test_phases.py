@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from phases import PHASE_MARKER, align_phases, read_markers  # noqa: E402
+
+START = 1_700_000_000.0  # Epoch seconds of the first sample
+
+
+@pytest.fixture
+def samples(tmp_path):
+    """
+    Ten seconds of synthetic energibridge samples every 100 ms: 20 W package power whose counter wraps
+    around after 0.4 s, and 5 W DRAM power. The first timestamp is repeated, as in energibridge's first rows.
+    """
+    times = np.append(START * 1000, START * 1000 + np.arange(101) * 100)
+    elapsed = (times - times[0]) / 1000
+    frame = pd.DataFrame({
+        "Delta": np.append(0, np.diff(times)),
+        "Time": times.astype(np.int64),
+        "DRAM_ENERGY (J)": 1000 + 5 * elapsed,
+        "PACKAGE_ENERGY (J)": (262136 + 20 * elapsed) % 262144,
+    })
+    path = tmp_path / "energy_results_test_0.csv"
+    frame.to_csv(path, index=False)
+    return pd.read_csv(path)
+
+
+def test_energy_and_power_per_phase(samples):
+    markers = [{"phase": "model_load", "start": START + 1, "end": START + 3},
+               {"phase": "input_256", "start": START + 3.05, "end": START + 9.5, "peak_rss": 512 * 2**20}]
+    phases = align_phases(samples, markers)
+
+    assert list(phases["Phase"]) == ["model_load", "input_256"]
+    assert phases["Duration (s)"].tolist() == pytest.approx([2, 6.45])
+    assert phases["Package Energy (J)"].tolist() == pytest.approx([40, 129])
+    assert phases["Package Power (W)"].tolist() == pytest.approx([20, 20])
+    assert phases["Dram Energy (J)"].tolist() == pytest.approx([10, 32.25])
+    assert np.isnan(phases["Peak RSS (MiB)"].iloc[0])
+    assert phases["Peak RSS (MiB)"].iloc[1] == 512
+
+
+def test_phases_outside_the_run(samples):
+    markers = [{"phase": "before", "start": START - 5, "end": START - 1},
+               {"phase": "partly", "start": START + 9, "end": START + 12},
+               {"phase": "after", "start": START + 11, "end": START + 12}]
+    phases = align_phases(samples, markers)
+
+    assert list(phases["Phase"]) == ["partly"]
+    assert np.isnan(phases["Package Energy (J)"].iloc[0])
+
+
+def test_read_markers(tmp_path):
+    marker = {"phase": "teardown", "start": START, "end": START + 1}
+    log = tmp_path / "energy_logs_test.txt"
+    log.write_text("Using cpu device\n"
+                   + PHASE_MARKER + json.dumps(marker) + "\n"
+                   + PHASE_MARKER + '{"phase": "cut off\n'
+                   + "Energy consumption in joules: 10.0 for 1.0 sec of execution.\n")
+    assert read_markers(log) == [marker]